@@ -0,0 +1,114 @@
+# benchmarks/ohlcv_schema.py
+
+# Legacy text-timestamp ohlcv vs the canonical WITHOUT ROWID (symbol, ts_epoch) table.
+# Run from the project root:  python -m benchmarks.ohlcv_schema [--symbols 500 --days 1260]
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from src.data.db import connect
+from src.data.migrate import migrate
+
+def build_legacy(path: str, n_symbols: int, n_days: int):
+    """The setup_db layout plus the (symbol, timestamp) index the freshness planner adds."""
+    conn = connect(path)
+    conn.execute("""
+        CREATE TABLE ohlcv (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            symbol TEXT, timestamp TEXT,
+            open REAL, high REAL, low REAL, close REAL, volume INTEGER
+        )
+    """)
+    conn.execute("CREATE INDEX idx_ohlcv_symbol_timestamp ON ohlcv (symbol, timestamp)")
+    start = datetime(2020, 1, 1, 5, tzinfo=timezone.utc)
+    days = [start + timedelta(days=i) for i in range(n_days * 7 // 5) if (start + timedelta(days=i)).weekday() < 5]
+    stamps = [d.astimezone(timezone(timedelta(hours=-5))).isoformat() for d in days[:n_days]]
+    with conn:
+        for s in range(n_symbols):
+            symbol = f"S{s:04d}"
+            conn.executemany(
+                "INSERT INTO ohlcv (symbol, timestamp, open, high, low, close, volume) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(symbol, ts, 1.0, 2.0, 0.5, 100 + random.random(), 1000) for ts in stamps],
+            )
+    conn.close()
+    return stamps
+
+def timed(conn, queries, repeat: int = 3) -> float:
+    """Best-of-`repeat` wall time (ms) to run every (sql, params) pair and fetch all rows."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for sql, params in queries:
+            conn.execute(sql, params).fetchall()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+def epoch(ts: str) -> int:
+    return int(datetime.fromisoformat(ts).timestamp())
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ohlcv schema migration.")
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--days", type=int, default=1260)
+    parser.add_argument("--lookups", type=int, default=200, help="Symbols queried per workload")
+    args = parser.parse_args()
+    if args.days < 2:
+        parser.error("--days must be at least 2")
+
+    random.seed(7)
+    tmp = tempfile.mkdtemp(prefix="ohlcv_bench_")
+    legacy_path, new_path = os.path.join(tmp, "legacy.db"), os.path.join(tmp, "canonical.db")
+    try:
+        stamps = build_legacy(legacy_path, args.symbols, args.days)
+        shutil.copy(legacy_path, new_path)
+        t0 = time.perf_counter()
+        migrate(new_path)
+        migrate_sec = time.perf_counter() - t0
+
+        symbols = [f"S{random.randrange(args.symbols):04d}" for _ in range(args.lookups)]
+        # Up to 250 bars from the middle of the history (fewer on short runs)
+        first = len(stamps) // 2
+        last = min(len(stamps) - 1, first + 250)
+        lo, hi = stamps[first], stamps[last]
+        year = lo[:4]
+        one_day = stamps[max(0, len(stamps) - 30)]
+        workloads = {
+            "1y range per symbol (LIKE 'YYYY%')": (
+                [("SELECT timestamp, close FROM ohlcv WHERE symbol=? AND timestamp LIKE ?", (s, f"{year}%")) for s in symbols],
+                [("SELECT ts_epoch, close FROM ohlcv WHERE symbol=? AND ts_epoch BETWEEN ? AND ?",
+                  (s, epoch(f"{year}-01-01T00:00:00+00:00"), epoch(f"{year}-12-31T23:59:59+00:00"))) for s in symbols],
+            ),
+            f"{last - first}-bar range per symbol": (
+                [("SELECT timestamp, close FROM ohlcv WHERE symbol=? AND timestamp BETWEEN ? AND ?", (s, lo, hi)) for s in symbols],
+                [("SELECT ts_epoch, close FROM ohlcv WHERE symbol=? AND ts_epoch BETWEEN ? AND ?", (s, epoch(lo), epoch(hi))) for s in symbols],
+            ),
+            "latest close per symbol": (
+                [("SELECT close FROM ohlcv WHERE symbol=? ORDER BY timestamp DESC LIMIT 1", (s,)) for s in symbols],
+                [("SELECT close FROM ohlcv WHERE symbol=? ORDER BY ts_epoch DESC LIMIT 1", (s,)) for s in symbols],
+            ),
+            "all closes on one date": (
+                [("SELECT symbol, close FROM ohlcv WHERE timestamp LIKE ?", (one_day[:10] + "%",))],
+                [("SELECT symbol, close FROM ohlcv WHERE ts_epoch BETWEEN ? AND ?",
+                  (epoch(one_day[:10] + "T00:00:00+00:00"), epoch(one_day[:10] + "T23:59:59+00:00")))],
+            ),
+        }
+
+        legacy, canonical = connect(legacy_path), connect(new_path)
+        print(f"{args.symbols} symbols x {args.days} bars; migration took {migrate_sec:.2f}s")
+        print(f"{'workload':<38}{'legacy ms':>12}{'canonical ms':>14}{'speedup':>10}")
+        for name, (old_queries, new_queries) in workloads.items():
+            old_ms, new_ms = timed(legacy, old_queries), timed(canonical, new_queries)
+            print(f"{name:<38}{old_ms:>12.1f}{new_ms:>14.1f}{old_ms / new_ms:>9.1f}x")
+        legacy.close()
+        canonical.close()
+        print(f"database size: legacy {os.path.getsize(legacy_path) / 1e6:.1f} MB, "
+              f"canonical {os.path.getsize(new_path) / 1e6:.1f} MB")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# benchmarks/scoring.py
+
+# Per-candidate predict loop (the old filter_and_score) vs engine.score_candidates.
+# Run from the project root:  python -m benchmarks.scoring [--candidates 1000]
+import argparse
+import copy
+import random
+import time
+
+import pandas as pd
+
+from src.strategy import engine
+from src.strategy.models import get_model
+
+def legacy_score_loop(candidates):
+    """The model part of the old filter_and_score: one single-row DataFrame and two predicts per stock."""
+    rf_model, xgb_model = get_model("rf"), get_model("xgb")
+    filtered = []
+    for stock in candidates:
+        if not stock["pe_ratio"] or stock["pe_ratio"] > 40:
+            continue
+        if stock["dividend_yield"] is not None and stock["dividend_yield"] < 0.01:
+            continue
+        pe = stock["pe_ratio"]
+        div = stock["dividend_yield"] or 0
+        mcap = stock.get("market_cap", 0)
+        sentiment = stock.get("avg_sentiment", 0) or 0
+        features_df = pd.DataFrame([[pe, div, mcap, sentiment]], columns=engine.FEATURE_COLUMNS)
+        rf_score = float(rf_model.predict(features_df)[0]) if rf_model else None
+        xgb_score = float(xgb_model.predict(features_df)[0]) if xgb_model else None
+        stock["rf_score"] = rf_score
+        stock["xgb_score"] = xgb_score
+        if xgb_score is not None:
+            score = xgb_score
+        elif rf_score is not None:
+            score = rf_score
+        else:
+            score = 0.05 * (1 / pe) + 0.1 * div + sentiment
+        stock["score"] = round(score, 4)
+        filtered.append(stock)
+    return filtered
+
+def synthetic_candidates(n: int):
+    random.seed(11)
+    return [
+        {
+            "symbol": f"S{i:05d}",
+            "pe_ratio": random.choice([None, 0, random.uniform(-10, 60)]) if random.random() < 0.1 else random.uniform(5, 45),
+            "dividend_yield": None if random.random() < 0.2 else random.uniform(0, 0.06),
+            "market_cap": random.uniform(1e9, 2e12),
+            "avg_sentiment": random.uniform(-0.5, 0.5),
+        }
+        for i in range(n)
+    ]
+
+def best_of(fn, candidates, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        batch = copy.deepcopy(candidates)
+        t0 = time.perf_counter()
+        result = fn(batch)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark candidate scoring.")
+    parser.add_argument("--candidates", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    candidates = synthetic_candidates(args.candidates)
+    loop_ms, loop_result = best_of(legacy_score_loop, candidates, args.repeat)
+    batch_ms, batch_result = best_of(engine.score_candidates, candidates, args.repeat)
+
+    assert [s["symbol"] for s in loop_result] == [s["symbol"] for s in batch_result]
+    mismatches = sum(
+        abs(a["score"] - b["score"]) > 1e-4 for a, b in zip(loop_result, batch_result)
+    )
+    print(f"{args.candidates} candidates, {len(batch_result)} pass the filters, {mismatches} score mismatches")
+    print(f"per-candidate loop: {loop_ms:9.1f} ms")
+    print(f"batch scoring:      {batch_ms:9.1f} ms  ({loop_ms / batch_ms:.0f}x faster)")
+
+if __name__ == "__main__":
+    main()
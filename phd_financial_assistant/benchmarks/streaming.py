@@ -0,0 +1,83 @@
+# benchmarks/streaming.py
+
+# Whole-universe ranking (load_candidates + filter_and_score) vs engine.stream_top_k,
+# on synthetic feature snapshots in a scratch database.
+# Run from the project root:  python -m benchmarks.streaming [--sizes 10000 50000]
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+_tmp = tempfile.mkdtemp(prefix="streaming_bench_")
+os.environ["MARKET_DATA_DB"] = os.path.join(_tmp, "bench.db")
+
+from datetime import datetime
+
+from src.data.db import transaction, bulk_insert
+from src.strategy import engine
+from src.strategy.features import FEATURE_SET_VERSION, FEATURES_DAILY_COLUMNS, init_features_daily_table
+
+SECTORS = ("Tech", "Health", "Energy", "Financials", "Utilities", "Industrials", "Materials", "Consumer")
+
+def fill_snapshot(n: int):
+    """Replace today's snapshot with `n` synthetic symbols."""
+    random.seed(n)
+    init_features_daily_table()
+    today = datetime.now().strftime("%Y-%m-%d")
+    rows = [
+        (
+            FEATURE_SET_VERSION, today, f"S{i:06d}",
+            random.uniform(5, 45) if random.random() > 0.1 else None,
+            None if random.random() < 0.2 else random.uniform(0, 0.06),
+            random.uniform(1e9, 2e12), random.choice(SECTORS), "Synthetic",
+            random.uniform(-0.5, 0.5), random.uniform(-0.5, 0.5),
+            random.uniform(-20, 20), random.uniform(0.5, 4), today,
+        )
+        for i in range(n)
+    ]
+    with transaction() as conn:
+        conn.execute("DELETE FROM features_daily")
+        bulk_insert("features_daily", FEATURES_DAILY_COLUMNS, rows, conn=conn)
+
+def full_ranking(k: int):
+    ranked = engine.filter_and_score(engine.load_candidates(None))
+    return ranked[:k]
+
+def streamed_ranking(k: int, sector_k: int, chunk_size: int):
+    return engine.stream_top_k(k, sector_k, chunk_size)[0]
+
+def measure(fn, *args):
+    """(wall ms, peak traced MB, result); timing and memory come from separate runs."""
+    t0 = time.perf_counter()
+    result = fn(*args)
+    wall_ms = (time.perf_counter() - t0) * 1000
+    tracemalloc.start()
+    fn(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return wall_ms, peak / 1e6, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming top-k scoring.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--sector-k", type=int, default=3)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    try:
+        print(f"{'symbols':>8}  {'full ms':>9} {'full MB':>9}  {'stream ms':>9} {'stream MB':>9}  same top-{args.k}")
+        for n in args.sizes:
+            fill_snapshot(n)
+            full_ms, full_mb, full_top = measure(full_ranking, args.k)
+            stream_ms, stream_mb, stream_top = measure(streamed_ranking, args.k, args.sector_k, args.chunk_size)
+            same = [s["symbol"] for s in full_top] == [s["symbol"] for s in stream_top]
+            print(f"{n:>8}  {full_ms:>9.1f} {full_mb:>9.1f}  {stream_ms:>9.1f} {stream_mb:>9.1f}  {same}")
+    finally:
+        shutil.rmtree(_tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,13 @@
 # src/dashboard/dashboard.py
 import streamlit as st
-import sqlite3
 from datetime import datetime
 import pandas as pd
 import os
 from src.trading.alpaca_client import buy_top_picks_with_alpaca, get_alpaca_portfolio, get_recent_alpaca_orders
-from src.strategy.engine import load_candidates, filter_and_score, allocate_portfolio, generate_explanation, enrich_sentiment
+from src.strategy.engine import allocate_portfolio, generate_explanation
+from src.strategy.scoring_service import get_ranked
 from src.strategy.portfolio import rebalance_alpaca_portfolio
+from src.data.db import get_connection
 
 st.set_page_config(page_title="📊 Financial Assistant Dashboard", layout="wide")
 st.title("📈 AI Financial Assistant")
@@ -87,20 +88,17 @@ if allocation is None:
     st.stop()
 
 # --- Sidebar controls with Select All/None for Sector and Symbol ---
-conn = sqlite3.connect("local_db/market_data.db")
 df = None
 try:
     df = (
         st.cache_data(show_spinner=False)(
             lambda: pd.read_sql_query(
-                "SELECT * FROM fundamentals", conn
+                "SELECT * FROM fundamentals", get_connection()
             )
         )()
     )
 except Exception as e:
     st.warning(f"Failed to load fundamentals: {e}")
-finally:
-    conn.close()
 
 st.sidebar.title("📂 Navigation")
 st.sidebar.markdown("- [Home](#ai-financial-assistant)")
@@ -156,6 +154,13 @@ else:
     selected_sectors, selected_symbols = [], []
 
 min_cap = st.sidebar.number_input("Min Market Cap ($B)", min_value=0.0, value=0.0)
+ALLOCATION_METHODS = {
+    "Proportional to score": "score",
+    "Risk parity": "risk_parity",
+    "Minimum variance": "min_variance",
+    "Score-tilted mean-variance": "mean_variance",
+}
+allocation_method = st.sidebar.selectbox("Allocation Method", list(ALLOCATION_METHODS))
 
 filtered = df[
     (df["sector"].isin(st.session_state.selected_sectors)) &
@@ -171,10 +176,9 @@ formatted_time = st.session_state.last_refresh.strftime("%Y-%m-%d %H:%M:%S.%f")[
 st.caption(f"🕒 Last refreshed: {formatted_time}")
 
 with st.spinner("Loading data..."):
-    stocks = load_candidates(symbols=filtered_symbols)
-    stocks = enrich_sentiment(stocks)
-    ranked = filter_and_score(stocks)
-    portfolio = allocate_portfolio(ranked, budget=allocation)
+    # Ranked feature snapshot from the scoring service (or in-process), recomputed only when inputs change
+    ranked = get_ranked(symbols=filtered_symbols)
+    portfolio = allocate_portfolio(ranked, budget=allocation, method=ALLOCATION_METHODS[allocation_method])
 
 if not ranked:
     st.warning("No qualified stocks to show. Try updating your dataset or adjusting filters.")
@@ -324,10 +328,13 @@ if recent_orders:
 else:
     st.info("No recent Alpaca orders found.")
 
-from src.strategy.portfolio import compute_alpaca_portfolio_analytics
+from src.strategy.portfolio import build_alpaca_portfolio_history, compute_alpaca_portfolio_analytics
+
+# One history build per render, shared by the analytics and the equity curve
+history = build_alpaca_portfolio_history(positions=alpaca_port)
 
 st.subheader("📊 Alpaca Portfolio Analytics")
-alpaca_analytics = compute_alpaca_portfolio_analytics()
+alpaca_analytics = compute_alpaca_portfolio_analytics(history)
 if alpaca_analytics:
     st.markdown(f"""
     - **Total Return:** {alpaca_analytics['total_return']}%
@@ -347,10 +354,7 @@ if st.button("🔄 Refresh Data"):
 
 import matplotlib.pyplot as plt
 
-from src.strategy.portfolio import build_alpaca_portfolio_history
-
 st.subheader("📉 Alpaca Portfolio Value Over Time")
-history = build_alpaca_portfolio_history()
 if history is not None and "portfolio_value" in history.columns:
     fig, ax = plt.subplots(figsize=(8,3))
     history["portfolio_value"].plot(ax=ax, label="Portfolio Value ($)", color="dodgerblue")
@@ -1,21 +1,79 @@
 # src/data/collector.py
 
 # Pull data from Alpaca or Yahoo Finance
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Tuple
+
 from alpaca_trade_api.rest import TimeFrame
 from src.trading.alpaca_client import api
-from src.data.storage import init_db, save_ohlcv
+from src.data.storage import init_db, save_ohlcv, get_watermarks, find_ohlcv_gaps
+from src.utils.ratelimit import TokenBucket
 
 from datetime import datetime, timedelta, timezone
 
+# Alpaca's free data plan allows 200 requests/minute; stay a little under it.
+DEFAULT_REQUESTS_PER_MINUTE = 180
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_WORKERS = 4
+# How far back to go the first time a symbol is seen
+DEEP_BACKFILL_DAYS = 5 * 365
+
+def _rfc3339(dt: datetime) -> str:
+    # Format as RFC3339 without microseconds
+    return dt.replace(microsecond=0).isoformat()
+
+def _from_epoch(ts_epoch: int) -> datetime:
+    return datetime.fromtimestamp(ts_epoch, timezone.utc)
+
+def _fetch_start(watermark: int, now: datetime, deep_days: int = DEEP_BACKFILL_DAYS) -> datetime:
+    """First timestamp worth asking for: just past the watermark (epoch seconds), or a deep backfill."""
+    if watermark:
+        return _from_epoch(watermark) + timedelta(seconds=1)
+    return now - timedelta(days=deep_days)
+
+def plan_fetch_jobs(symbols: List[str], batch_size: int = DEFAULT_BATCH_SIZE, deep_days: int = DEEP_BACKFILL_DAYS,
+                    fill_gaps: bool = False) -> List[Tuple[List[str], str, str]]:
+    """
+    Turn the watermark table into a list of (symbols, start, end) requests.
+
+    Symbols whose watermark is the same (the usual case after a daily run) share
+    multi-symbol requests, so a daily refresh only asks for bars newer than what
+    is stored. Unseen symbols get a deep backfill. With `fill_gaps`, holes inside
+    the stored history are requested as well.
+    """
+    now = datetime.now(timezone.utc)
+    end_str = _rfc3339(now)
+    watermarks = get_watermarks()
+
+    by_start = {}
+    for symbol in symbols:
+        start = _fetch_start(watermarks.get(symbol), now, deep_days)
+        if start >= now:
+            continue
+        by_start.setdefault(_rfc3339(start), []).append(symbol)
+
+    jobs = []
+    for start_str, group in sorted(by_start.items()):
+        for i in range(0, len(group), batch_size):
+            jobs.append((group[i:i + batch_size], start_str, end_str))
+
+    if fill_gaps:
+        for symbol, after_epoch, before_epoch in find_ohlcv_gaps(symbols):
+            start = _from_epoch(after_epoch) + timedelta(seconds=1)
+            end = _from_epoch(before_epoch) - timedelta(seconds=1)
+            jobs.append(([symbol], _rfc3339(start), _rfc3339(end)))
+    return jobs
+
 def fetch_and_store(symbol: str, timeframe: TimeFrame = TimeFrame.Day, limit: int = 100):
     print(f"Fetching OHLCV for {symbol}...")
 
-    end_date = datetime.now(timezone.utc)
-    start_date = end_date - timedelta(days=200)
-
-    # Format as RFC3339 without microseconds
-    start_str = start_date.replace(microsecond=0).isoformat()
-    end_str = end_date.replace(microsecond=0).isoformat()
+    now = datetime.now(timezone.utc)
+    start = _fetch_start(get_watermarks().get(symbol), now)
+    if start >= now:
+        print(f"{symbol} is already up to date.")
+        return
+    start_str, end_str = _rfc3339(start), _rfc3339(now)
 
     bars = api.get_bars(
         symbol.upper(),
@@ -28,5 +86,75 @@ def fetch_and_store(symbol: str, timeframe: TimeFrame = TimeFrame.Day, limit: in
         print(f"No bars returned for {symbol}.")
         return
 
-    save_ohlcv(symbol, list(bars))
+    save_ohlcv(symbol, list(bars), timeframe=timeframe.value)
     print(f"Saved {len(bars)} bars for {symbol}.")
+
+def fetch_bars_batch(symbols: List[str], start: str, end: str,
+                     timeframe: TimeFrame = TimeFrame.Day, client=None) -> Dict[str, list]:
+    """
+    Fetch bars for several symbols with a single multi-symbol request.
+    Returns {symbol: [bar, ...]}; symbols without bars are left out.
+    """
+    client = client or api
+    bars = client.get_bars(
+        [s.upper() for s in symbols],
+        timeframe,
+        start=start,
+        end=end,
+        feed='iex'
+    )
+    grouped = {}
+    for bar in bars:
+        grouped.setdefault(bar.S, []).append(bar)
+    return grouped
+
+def collect_concurrently(symbols: List[str], timeframe: TimeFrame = TimeFrame.Day,
+                         deep_days: int = DEEP_BACKFILL_DAYS, fill_gaps: bool = False,
+                         batch_size: int = DEFAULT_BATCH_SIZE, max_workers: int = DEFAULT_WORKERS,
+                         requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE, client=None) -> Dict:
+    """
+    Fetch OHLCV bars for many symbols at once.
+
+    Requests come from `plan_fetch_jobs`: only bars newer than each symbol's
+    watermark are asked for, batched `batch_size` symbols per request. At most
+    `max_workers` requests are in flight, all sharing a `requests_per_minute`
+    budget. Results are written by the calling thread only, so SQLite sees a
+    single writer.
+
+    Returns a dict of run stats including symbols/sec and bars/sec throughput.
+    """
+    init_db()
+    jobs = plan_fetch_jobs(symbols, batch_size=batch_size, deep_days=deep_days, fill_gaps=fill_gaps)
+    limiter = TokenBucket.per_minute(requests_per_minute, capacity=max_workers)
+
+    def fetch(job):
+        batch, start_str, end_str = job
+        limiter.acquire()
+        return fetch_bars_batch(batch, start_str, end_str, timeframe=timeframe, client=client)
+
+    stats = {"symbols": 0, "bars": 0, "requests": len(jobs), "failed_symbols": []}
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(fetch, job): job[0] for job in jobs}
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                grouped = future.result()
+            except Exception as e:
+                print(f"Error fetching batch {batch[0]}..{batch[-1]}: {e}")
+                stats["failed_symbols"].extend(batch)
+                continue
+            for symbol, bars in grouped.items():
+                save_ohlcv(symbol, bars, timeframe=timeframe.value)
+                stats["symbols"] += 1
+                stats["bars"] += len(bars)
+
+    elapsed = time.perf_counter() - t0
+    stats["elapsed_sec"] = round(elapsed, 3)
+    stats["symbols_per_sec"] = round(stats["symbols"] / elapsed, 2) if elapsed > 0 else None
+    stats["bars_per_sec"] = round(stats["bars"] / elapsed, 2) if elapsed > 0 else None
+    print(
+        f"Collected {stats['bars']} bars for {stats['symbols']} symbols in {stats['elapsed_sec']}s "
+        f"({stats['symbols_per_sec']} symbols/sec, {stats['bars_per_sec']} bars/sec)"
+    )
+    return stats
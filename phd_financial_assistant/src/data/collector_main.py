@@ -1,40 +1,45 @@
 # src/data/collector_main.py
 
-from src.data.collector import fetch_and_store
+from src.data.collector import (
+    fetch_and_store, collect_concurrently,
+    DEFAULT_BATCH_SIZE, DEFAULT_WORKERS, DEFAULT_REQUESTS_PER_MINUTE,
+)
+from src.data.storage import init_db
+from src.data.freshness import build_refresh_plan
 from alpaca_trade_api.rest import TimeFrame
-import sqlite3
-
-def get_all_symbols():
-    conn = sqlite3.connect("local_db/market_data.db")
-    cur = conn.cursor()
-    cur.execute("SELECT symbol FROM fundamentals")
-    symbols = [row[0] for row in cur.fetchall()]
-    conn.close()
-    # Filter out index symbols (those starting with ^)
-    return [s for s in symbols if not s.startswith('^')]
-
-def has_ohlcv_for_today(symbol):
-    import sqlite3
-    from datetime import datetime
-    today = datetime.now().strftime("%Y-%m-%d")
-    conn = sqlite3.connect("local_db/market_data.db")
-    c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM ohlcv WHERE symbol=? AND timestamp LIKE ?", (symbol, f"{today}%"))
-    exists = c.fetchone()[0] > 0
-    conn.close()
-    return exists
+import argparse
 
 if __name__ == "__main__":
-    symbols = get_all_symbols()
-    for symbol in symbols:
-        if has_ohlcv_for_today(symbol):
-            continue  # Skip if up to date
-        # fetch and store bars
-        print(f"Fetching OHLCV for {symbol}...")
-        try:
-            fetch_and_store(symbol, timeframe=TimeFrame.Day, limit=100)
-        except Exception as e:
-            print(f"Error fetching {symbol}: {e}")
+    parser = argparse.ArgumentParser(description="Fetch daily OHLCV bars for all symbols.")
+    parser.add_argument("--serial", action="store_true", help="Fetch one symbol per request (old behaviour)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent requests in flight")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Symbols per bars request")
+    parser.add_argument("--rpm", type=float, default=DEFAULT_REQUESTS_PER_MINUTE, help="Request budget per minute")
+    parser.add_argument("--fill-gaps", action="store_true", help="Also re-request holes inside stored history")
+    args = parser.parse_args()
+
+    init_db()
+    plan = build_refresh_plan()
+    # Gap filling needs to look at every symbol, not just the stale ones
+    symbols = plan["universe"] if args.fill_gaps else plan["ohlcv"]
+    print(f"{len(symbols)} of {len(plan['universe'])} symbols need OHLCV.")
+    if args.serial:
+        for symbol in symbols:
+            # fetch and store bars
+            print(f"Fetching OHLCV for {symbol}...")
+            try:
+                fetch_and_store(symbol, timeframe=TimeFrame.Day, limit=100)
+            except Exception as e:
+                print(f"Error fetching {symbol}: {e}")
+    elif symbols:
+        collect_concurrently(
+            symbols,
+            timeframe=TimeFrame.Day,
+            batch_size=args.batch_size,
+            max_workers=args.workers,
+            requests_per_minute=args.rpm,
+            fill_gaps=args.fill_gaps,
+        )
     print("Data collection complete.")
     print("All symbols processed.")
     print("You can now run the strategy engine to analyze the data.")
\ No newline at end of file
@@ -0,0 +1,234 @@
+# src/data/columnar.py
+
+# Columnar, memory-mapped copy of daily closes/volumes for fast analytics reads
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from src.data.db import DB_PATH, get_connection
+from src.data.migrate import DEFAULT_TIMEFRAME
+
+# One directory per database, next to it: <db name>_columnar/
+COLUMNAR_DIR = os.path.splitext(DB_PATH)[0] + "_columnar"
+FIELDS = ("close", "volume")
+# One structured array per symbol, so a rewrite replaces all fields atomically
+BAR_DTYPE = np.dtype([("day", np.int64), ("close", np.float64), ("volume", np.float64)])
+
+# path -> (mtime_ns, size, memmap); reopened only when the file is replaced
+_open_arrays = {}
+# root -> (watermark version, symbols the ohlcv table had no daily bars for)
+_no_bars = {}
+
+def _path(symbol: str, root: str = COLUMNAR_DIR) -> str:
+    return os.path.join(root, f"{symbol.replace('/', '_')}.npy")
+
+def _load(path: str):
+    """Memory-map a stored array, reusing the open map while the file is unchanged."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    cached = _open_arrays.get(path)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    # Plain ndarray view over the map: still zero-copy, without memmap's per-slice overhead
+    arr = np.asarray(np.load(path, mmap_mode="r"))
+    _open_arrays[path] = (st.st_mtime_ns, st.st_size, arr)
+    return arr
+
+def _save(path: str, arr: np.ndarray):
+    # Write then rename, so readers never see a half-written file; the temp name is
+    # per process and thread, so concurrent writers of one symbol never share it
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npy"
+    try:
+        np.save(tmp, arr)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+def to_day(ts_epoch: int) -> int:
+    """
+    Days since 1970-01-01 for a bar's epoch seconds. Daily bars are stamped at
+    midnight New York time (04:00/05:00 UTC), so the UTC date is the trading date.
+    """
+    return int(ts_epoch) // 86400
+
+def write_symbol(symbol: str, days, close, volume, root: str = COLUMNAR_DIR, replace: bool = False):
+    """
+    Merge bars into a symbol's arrays. Days already stored keep their values,
+    matching the INSERT OR IGNORE semantics of the ohlcv table. With `replace`
+    the stored arrays are overwritten instead.
+    """
+    os.makedirs(root, exist_ok=True)
+    new = np.empty(len(days), dtype=BAR_DTYPE)
+    new["day"], new["close"], new["volume"] = days, close, volume
+    old = None if replace else _load(_path(symbol, root))
+    if old is not None and len(old):
+        merged = np.concatenate([np.asarray(old), new[~np.isin(new["day"], old["day"])]])
+    else:
+        merged = new
+    merged = merged[np.argsort(merged["day"], kind="stable")]
+    # Drop duplicate days inside the new batch itself
+    if len(merged):
+        merged = merged[np.concatenate([[True], np.diff(merged["day"]) != 0])]
+    _save(_path(symbol, root), merged)
+
+def append_rows(symbol: str, rows: List[tuple], root: str = COLUMNAR_DIR):
+    """
+    Sync from daily ohlcv rows shaped
+    (symbol, ts_epoch, timeframe, open, high, low, close, volume)
+    that were just written to the table.
+    """
+    if not rows:
+        return
+    if not os.path.exists(_path(symbol, root)):
+        # First sync for this symbol: take its whole history, not just these rows
+        _copy_from_db([symbol], root)
+        return
+    write_symbol(
+        symbol,
+        [to_day(r[1]) for r in rows],
+        [r[6] for r in rows],
+        [r[7] for r in rows],
+        root=root,
+    )
+
+def load_series(symbol: str, start=None, end=None, root: str = COLUMNAR_DIR,
+                backfill: bool = True) -> Dict[str, np.ndarray]:
+    """
+    Zero-copy views of one symbol's stored bars between `start` and `end`
+    (inclusive; ISO dates or datetime64). A symbol missing from the store is
+    copied in from the ohlcv table first (unless `backfill` is off).
+    Returns {} if the symbol has no bars at all.
+    """
+    bars = _load(_path(symbol, root))
+    if bars is None and backfill:
+        _backfill([symbol], root)
+        bars = _load(_path(symbol, root))
+    if bars is None:
+        return {}
+    days = bars["day"]
+    lo = 0 if start is None else np.searchsorted(days, np.datetime64(start, "D").astype(np.int64), "left")
+    hi = len(days) if end is None else np.searchsorted(days, np.datetime64(end, "D").astype(np.int64), "right")
+    window = bars[lo:hi]
+    return {"day": window["day"], **{field: window[field] for field in FIELDS}}
+
+def load_matrix(symbols: List[str], start=None, end=None, fields=FIELDS, root: str = COLUMNAR_DIR) -> Dict:
+    """
+    Aligned price matrices for `symbols` over a date range.
+
+    Returns {"symbols": [...], "dates": datetime64[D] array, <field>: 2D array}
+    with one row per symbol and one column per date any of them traded; missing
+    bars are NaN. Symbols with no bars at all come back as all-NaN rows.
+    """
+    _backfill(symbols, root)
+    series = [load_series(s, start, end, root, backfill=False) for s in symbols]
+    present = [s["day"] for s in series if s and len(s["day"])]
+    if present:
+        # Union of trading days via a dense calendar bitmap (no sort needed)
+        lo = min(d[0] for d in present)
+        seen = np.zeros(max(d[-1] for d in present) - lo + 1, dtype=bool)
+        for d in present:
+            seen[d - lo] = True
+        dates = np.flatnonzero(seen) + lo
+        column_of = np.cumsum(seen) - 1
+    else:
+        dates = np.array([], dtype=np.int64)
+    out = {"symbols": list(symbols), "dates": dates.astype("datetime64[D]")}
+    for field in fields:
+        out[field] = np.full((len(symbols), len(dates)), np.nan)
+    for i, s in enumerate(series):
+        if not s or not len(s["day"]):
+            continue
+        cols = column_of[s["day"] - lo]
+        for field in fields:
+            out[field][i, cols] = s[field]
+    return out
+
+def stored_symbols(root: str = COLUMNAR_DIR) -> List[str]:
+    if not os.path.isdir(root):
+        return []
+    return sorted(name[:-len(".npy")] for name in os.listdir(root) if name.endswith(".npy") and ".tmp" not in name)
+
+def _watermark_version():
+    try:
+        return get_connection().execute(
+            "SELECT COUNT(*), MAX(last_epoch), MAX(updated_at) FROM ohlcv_watermarks"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+
+def _backfill(symbols: List[str], root: str = COLUMNAR_DIR):
+    """
+    Copy symbols missing from the store in from the ohlcv table. Symbols found
+    to have no bars are remembered until the watermarks move, so repeated loads
+    do not query the table for them again.
+    """
+    missing = [s for s in symbols if not os.path.exists(_path(s, root))]
+    if not missing:
+        return
+    version = _watermark_version()
+    cached_version, empty = _no_bars.get(root, (None, frozenset()))
+    if cached_version != version:
+        empty = frozenset()
+    missing = [s for s in missing if s not in empty]
+    if missing:
+        _copy_from_db(missing, root)
+        empty = empty | {s for s in missing if not os.path.exists(_path(s, root))}
+    _no_bars[root] = (version, empty)
+
+def _copy_from_db(symbols: List[str] = None, root: str = COLUMNAR_DIR) -> int:
+    """Overwrite the stored arrays of `symbols` (all symbols if None) from the daily bars in ohlcv."""
+    query = (
+        "SELECT symbol, ts_epoch, close, volume FROM ohlcv WHERE timeframe = ? {symbols} "
+        "ORDER BY symbol, ts_epoch"
+    )
+    try:
+        if symbols:
+            placeholder = ",".join(["?"] * len(symbols))
+            cur = get_connection().execute(
+                query.format(symbols=f"AND symbol IN ({placeholder})"), [DEFAULT_TIMEFRAME, *symbols]
+            )
+        else:
+            cur = get_connection().execute(query.format(symbols=""), [DEFAULT_TIMEFRAME])
+    except sqlite3.OperationalError:
+        # No ohlcv table yet
+        return 0
+    count, symbol, days, closes, volumes = 0, None, [], [], []
+    for sym, ts, close, volume in cur:
+        if sym != symbol:
+            if symbol is not None:
+                write_symbol(symbol, days, closes, volumes, root, replace=True)
+                count += 1
+            symbol, days, closes, volumes = sym, [], [], []
+        days.append(to_day(ts))
+        closes.append(close)
+        volumes.append(volume)
+    if symbol is not None:
+        write_symbol(symbol, days, closes, volumes, root, replace=True)
+        count += 1
+    return count
+
+def rebuild_from_db(root: str = COLUMNAR_DIR) -> int:
+    """Regenerate the store from the ohlcv table. Returns the number of symbols written."""
+    return _copy_from_db(None, root)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the columnar OHLCV store.")
+    parser.add_argument("--rebuild", action="store_true", help="Regenerate the store from the ohlcv table")
+    args = parser.parse_args()
+    if args.rebuild:
+        t0 = time.perf_counter()
+        n = rebuild_from_db()
+        print(f"Rebuilt columnar store for {n} symbols in {time.perf_counter() - t0:.1f}s ({COLUMNAR_DIR})")
+    else:
+        print(f"{len(stored_symbols())} symbols in {COLUMNAR_DIR}")
@@ -0,0 +1,108 @@
+# src/data/freshness.py
+
+# Decide what needs refreshing for the whole universe in one query
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from src.data.db import DB_PATH, get_connection, transaction
+from src.data.migrate import migrate
+
+# Fundamentals older than this are refetched (override with FUNDAMENTALS_TTL_DAYS)
+FUNDAMENTALS_TTL_DAYS = float(os.getenv("FUNDAMENTALS_TTL_DAYS", 7))
+
+# (table, columns) pairs the planner's grouped query relies on
+FRESHNESS_INDEXES = {
+    "idx_ohlcv_symbol_ts": ("ohlcv", ("symbol", "ts_epoch")),
+    "idx_news_symbol_published": ("news", ("symbol", "published")),
+    "idx_fundamentals_symbol": ("fundamentals", ("symbol",)),
+}
+
+def _existing_tables(cur) -> set:
+    cur.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    return {row[0] for row in cur.fetchall()}
+
+def _has_index_on(cur, table: str, columns: tuple) -> bool:
+    """True if some index on `table` (including a primary key) starts with `columns`."""
+    cur.execute(f"PRAGMA index_list({table})")
+    for index in cur.fetchall():
+        cur.execute(f"PRAGMA index_info({index[1]})")
+        indexed = tuple(row[2] for row in sorted(cur.fetchall()))
+        if indexed[:len(columns)] == columns:
+            return True
+    return False
+
+def ensure_freshness_schema(db_path=DB_PATH):
+    """
+    Bring ohlcv onto the current schema, add fundamentals.fetched_at to older
+    databases and create the indexes behind the freshness query, unless an
+    equivalent index already exists. Takes a write lock: run it once at
+    startup (init_db and the pipeline do), not per plan.
+    """
+    migrate(db_path, vacuum=False)
+    with transaction(db_path) as conn:
+        cur = conn.cursor()
+        tables = _existing_tables(cur)
+        if "fundamentals" in tables:
+            cur.execute("PRAGMA table_info(fundamentals)")
+            if "fetched_at" not in {row[1] for row in cur.fetchall()}:
+                cur.execute("ALTER TABLE fundamentals ADD COLUMN fetched_at TEXT")
+        for name, (table, columns) in FRESHNESS_INDEXES.items():
+            if table in tables and not _has_index_on(cur, table, columns):
+                cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+
+def build_refresh_plan(today: str = None, fundamentals_ttl_days: float = FUNDAMENTALS_TTL_DAYS,
+                       db_path=DB_PATH) -> Dict[str, List[str]]:
+    """
+    Build the work plan for every symbol in the universe from one grouped query.
+
+    Returns a dict with:
+        universe      all symbols (index tickers like ^GSPC excluded)
+        ohlcv         symbols with no bar dated `today`
+        news          symbols with no headline published `today`
+        fundamentals  symbols whose fundamentals are empty or older than the TTL
+
+    Read-only, so planning never waits on ingestion writers. Without
+    ensure_freshness_schema having run, the query still works, only slower.
+    """
+    today = today or datetime.now().strftime("%Y-%m-%d")
+    fundamentals_cutoff = (datetime.now() - timedelta(days=fundamentals_ttl_days)).isoformat(timespec="seconds")
+    cur = get_connection(db_path).cursor()
+    tables = _existing_tables(cur)
+    if "fundamentals" not in tables:
+        return {"universe": [], "ohlcv": [], "news": [], "fundamentals": []}
+    cur.execute("PRAGMA table_info(fundamentals)")
+    # Older databases lack fetched_at until ensure_freshness_schema adds it: every row counts as expired
+    fetched_at = "f.fetched_at" if "fetched_at" in {row[1] for row in cur.fetchall()} else "NULL AS fetched_at"
+
+    ohlcv_join = (
+        "LEFT JOIN (SELECT symbol, date(MAX(ts_epoch), 'unixepoch') AS last_bar FROM ohlcv GROUP BY symbol) o "
+        "ON o.symbol = f.symbol"
+        if "ohlcv" in tables else "LEFT JOIN (SELECT NULL AS symbol, NULL AS last_bar) o ON 0"
+    )
+    news_join = (
+        "LEFT JOIN (SELECT symbol, MAX(published) AS last_news FROM news GROUP BY symbol) n ON n.symbol = f.symbol"
+        if "news" in tables else "LEFT JOIN (SELECT NULL AS symbol, NULL AS last_news) n ON 0"
+    )
+    cur.execute(f"""
+        SELECT f.symbol, {fetched_at}, o.last_bar, n.last_news
+        FROM fundamentals f
+        {ohlcv_join}
+        {news_join}
+        ORDER BY f.symbol
+    """)
+    rows = cur.fetchall()
+
+    plan = {"universe": [], "ohlcv": [], "news": [], "fundamentals": []}
+    for symbol, fetched_at, last_bar, last_news in rows:
+        # Exclude index symbols (like ^GSPC)
+        if symbol.startswith('^'):
+            continue
+        plan["universe"].append(symbol)
+        if not last_bar or last_bar[:10] < today:
+            plan["ohlcv"].append(symbol)
+        if not last_news or last_news[:10] < today:
+            plan["news"].append(symbol)
+        if not fetched_at or fetched_at < fundamentals_cutoff:
+            plan["fundamentals"].append(symbol)
+    return plan
@@ -1,46 +1,92 @@
 # src/data/fundamentals.py
 
+import random
+import time
 import yfinance as yf
-import sqlite3
-import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List
+from src.data.db import DB_PATH, transaction, bulk_insert
+from src.utils.ratelimit import TokenBucket
 
-FUNDAMENTALS_DB = os.path.join(os.path.dirname(__file__), "../../local_db/market_data.db")
+FUNDAMENTALS_DB = DB_PATH
+
+DEFAULT_WORKERS = 8
+DEFAULT_REQUESTS_PER_MINUTE = 240
+DEFAULT_RETRIES = 3
+
+FUNDAMENTALS_COLUMNS = ("symbol", "pe_ratio", "dividend_yield", "market_cap", "sector", "industry", "fetched_at")
 
 def init_fundamentals_table():
-    conn = sqlite3.connect(FUNDAMENTALS_DB)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS fundamentals (
-            symbol TEXT PRIMARY KEY,
-            pe_ratio REAL,
-            dividend_yield REAL,
-            market_cap REAL,
-            sector TEXT,
-            industry TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    with transaction(FUNDAMENTALS_DB) as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS fundamentals (
+                symbol TEXT PRIMARY KEY,
+                pe_ratio REAL,
+                dividend_yield REAL,
+                market_cap REAL,
+                sector TEXT,
+                industry TEXT,
+                fetched_at TEXT
+            )
+        ''')
 
-def fetch_and_store_fundamentals(symbol: str):
+def fetch_fundamentals(symbol: str) -> tuple:
+    """Fetch one symbol's fundamentals from Yahoo as a row for the fundamentals table."""
     ticker = yf.Ticker(symbol)
     info = ticker.info
 
-    data = (
+    return (
         symbol,
         info.get("trailingPE"),
         info.get("dividendYield"),
         info.get("marketCap"),
         info.get("sector"),
-        info.get("industry")
+        info.get("industry"),
+        datetime.now().isoformat(timespec="seconds"),
     )
 
-    conn = sqlite3.connect(FUNDAMENTALS_DB)
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT OR REPLACE INTO fundamentals 
-        (symbol, pe_ratio, dividend_yield, market_cap, sector, industry)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', data)
-    conn.commit()
-    conn.close()
+def fetch_and_store_fundamentals(symbol: str):
+    data = fetch_fundamentals(symbol)
+    bulk_insert("fundamentals", FUNDAMENTALS_COLUMNS, [data], conflict="REPLACE", db_path=FUNDAMENTALS_DB)
+
+def _fetch_with_retry(symbol: str, limiter: TokenBucket, retries: int, backoff: float) -> tuple:
+    for attempt in range(retries + 1):
+        limiter.acquire()
+        try:
+            return fetch_fundamentals(symbol)
+        except Exception:
+            if attempt == retries:
+                raise
+            # Exponential backoff with jitter so workers don't retry in lockstep
+            time.sleep(backoff * (2 ** attempt) * (1 + random.random()))
+
+def refresh_fundamentals(symbols: List[str], max_workers: int = DEFAULT_WORKERS,
+                         requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+                         retries: int = DEFAULT_RETRIES, backoff: float = 1.0) -> Dict:
+    """
+    Fetch fundamentals for `symbols` on a thread pool and write them back in a
+    single transaction.
+
+    All workers share one `requests_per_minute` budget; a failing symbol is
+    retried with exponential backoff and, if it still fails, left stale so the
+    next run picks it up again.
+    """
+    limiter = TokenBucket.per_minute(requests_per_minute, capacity=max_workers)
+    rows, failed = [], []
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_fetch_with_retry, s, limiter, retries, backoff): s for s in symbols}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                rows.append(future.result())
+            except Exception as e:
+                print(f"Error fetching fundamentals for {symbol}: {e}")
+                failed.append(symbol)
+
+    if rows:
+        bulk_insert("fundamentals", FUNDAMENTALS_COLUMNS, rows, conflict="REPLACE", db_path=FUNDAMENTALS_DB)
+    elapsed = time.perf_counter() - t0
+    print(f"Refreshed fundamentals for {len(rows)} symbols in {elapsed:.1f}s ({len(failed)} failed).")
+    return {"refreshed": len(rows), "failed": failed, "elapsed_sec": round(elapsed, 3)}
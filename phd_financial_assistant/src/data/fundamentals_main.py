@@ -1,34 +1,28 @@
 # src/data/fundamentals_main.py
 
-from src.data.fundamentals import fetch_and_store_fundamentals
-import sqlite3
-
-def get_all_symbols():
-    conn = sqlite3.connect("local_db/market_data.db")
-    cur = conn.cursor()
-    cur.execute("SELECT symbol FROM fundamentals")
-    symbols = [row[0] for row in cur.fetchall()]
-    conn.close()
-    return symbols
-
-def is_fundamental_up_to_date(symbol):
-    import sqlite3
-    conn = sqlite3.connect("local_db/market_data.db")
-    c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM fundamentals WHERE symbol=?", (symbol,))
-    exists = c.fetchone()[0] > 0
-    conn.close()
-    return exists
+from src.data.fundamentals import (
+    refresh_fundamentals, DEFAULT_WORKERS, DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_RETRIES,
+)
+from src.data.freshness import build_refresh_plan, ensure_freshness_schema, FUNDAMENTALS_TTL_DAYS
+import argparse
 
 if __name__ == "__main__":
-    symbols = get_all_symbols()
-    for symbol in symbols:
-        if is_fundamental_up_to_date(symbol):
-            continue  # skip if already present
-        # fetch and store...
-        print(f"Fetching fundamentals for {symbol}...")
-        try:
-            fetch_and_store_fundamentals(symbol)
-        except Exception as e:
-            print(f"Error fetching fundamentals for {symbol}: {e}")
+    parser = argparse.ArgumentParser(description="Refresh empty or expired fundamentals.")
+    parser.add_argument("--ttl-days", type=float, default=FUNDAMENTALS_TTL_DAYS, help="Refetch rows older than this")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent Yahoo requests")
+    parser.add_argument("--rpm", type=float, default=DEFAULT_REQUESTS_PER_MINUTE, help="Request budget per minute")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help="Retries per symbol before giving up")
+    args = parser.parse_args()
+
+    # Older databases need fundamentals.fetched_at before rows are written
+    ensure_freshness_schema()
+    plan = build_refresh_plan(fundamentals_ttl_days=args.ttl_days)
+    print(f"{len(plan['fundamentals'])} of {len(plan['universe'])} symbols need fundamentals.")
+    if plan["fundamentals"]:
+        refresh_fundamentals(
+            plan["fundamentals"],
+            max_workers=args.workers,
+            requests_per_minute=args.rpm,
+            retries=args.retries,
+        )
     print("Done.")
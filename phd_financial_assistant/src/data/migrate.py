@@ -0,0 +1,127 @@
+# src/data/migrate.py
+
+# Canonical OHLCV schema and the migration that brings older databases onto it
+import argparse
+import time
+from datetime import datetime
+
+from src.data.db import DB_PATH, get_connection, transaction
+
+DEFAULT_TIMEFRAME = "1Day"
+
+# Bars are clustered on (symbol, ts_epoch): a per-symbol date range is one
+# contiguous B-tree scan, and the table itself covers every column, so no
+# separate lookup is needed. ts_epoch is Unix seconds (UTC).
+OHLCV_DDL = """
+    CREATE TABLE IF NOT EXISTS ohlcv (
+        symbol TEXT NOT NULL,
+        ts_epoch INTEGER NOT NULL,
+        timeframe TEXT NOT NULL DEFAULT '1Day',
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume INTEGER,
+        PRIMARY KEY (symbol, ts_epoch)
+    ) WITHOUT ROWID
+"""
+# Cross-sectional reads (all closes on a date, newest bar overall) without touching the table
+OHLCV_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_ohlcv_ts_symbol_close ON ohlcv (ts_epoch, symbol, close)",
+)
+WATERMARKS_DDL = """
+    CREATE TABLE IF NOT EXISTS ohlcv_watermarks (
+        symbol TEXT PRIMARY KEY,
+        first_epoch INTEGER,
+        last_epoch INTEGER,
+        updated_at TEXT
+    )
+"""
+
+def _columns(conn, table: str) -> set:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+def _is_without_rowid(conn, table: str) -> bool:
+    try:
+        conn.execute(f"SELECT rowid FROM {table} LIMIT 0")
+    except Exception:
+        return True
+    return False
+
+def ohlcv_is_current(conn) -> bool:
+    """True if ohlcv is absent or already on the canonical schema."""
+    columns = _columns(conn, "ohlcv")
+    return not columns or ("ts_epoch" in columns and _is_without_rowid(conn, "ohlcv"))
+
+def ensure_ohlcv_schema(conn):
+    """Create ohlcv, its indexes and the watermark table if they are missing."""
+    conn.execute(OHLCV_DDL)
+    for ddl in OHLCV_INDEXES:
+        conn.execute(ddl)
+    conn.execute(WATERMARKS_DDL)
+
+def migrate_ohlcv(conn) -> dict:
+    """
+    Rebuild a legacy ohlcv table (text timestamps, either the AUTOINCREMENT or
+    the (symbol, timestamp) layout) as the canonical table. Duplicate bars keep
+    the first stored copy; rows whose timestamp cannot be parsed are dropped.
+    Watermarks are rebuilt from the migrated bars. Does nothing if the table is
+    already current. Runs inside the caller's transaction.
+    """
+    if ohlcv_is_current(conn):
+        ensure_ohlcv_schema(conn)
+        return {"migrated": False}
+    columns = _columns(conn, "ohlcv")
+    order = "id" if "id" in columns else "rowid"
+    timeframe = "timeframe" if "timeframe" in columns else f"'{DEFAULT_TIMEFRAME}'"
+    before = conn.execute("SELECT COUNT(*) FROM ohlcv").fetchone()[0]
+
+    conn.execute("ALTER TABLE ohlcv RENAME TO ohlcv_legacy")
+    conn.execute("DROP TABLE IF EXISTS ohlcv_watermarks")
+    ensure_ohlcv_schema(conn)
+    # SQLite's strftime understands ISO timestamps with a +HH:MM offset or Z
+    conn.execute(f"""
+        INSERT OR IGNORE INTO ohlcv (symbol, ts_epoch, timeframe, open, high, low, close, volume)
+        SELECT symbol, ts, {timeframe}, open, high, low, close, volume FROM (
+            SELECT *, CAST(strftime('%s', timestamp) AS INTEGER) AS ts FROM ohlcv_legacy ORDER BY {order}
+        )
+        WHERE symbol IS NOT NULL AND ts IS NOT NULL
+    """)
+    after = conn.execute("SELECT COUNT(*) FROM ohlcv").fetchone()[0]
+    conn.execute("DROP TABLE ohlcv_legacy")
+    conn.execute("""
+        INSERT INTO ohlcv_watermarks (symbol, first_epoch, last_epoch, updated_at)
+        SELECT symbol, MIN(ts_epoch), MAX(ts_epoch), ? FROM ohlcv GROUP BY symbol
+    """, (datetime.now().isoformat(timespec="seconds"),))
+    return {"migrated": True, "rows_before": before, "rows_after": after, "dropped": before - after}
+
+def migrate(db_path=DB_PATH, vacuum: bool = True) -> dict:
+    """
+    Bring the database at `db_path` onto the current schema. Safe to run any
+    number of times; a current database is left untouched.
+    """
+    with transaction(db_path) as conn:
+        # sqlite3 does not open a transaction before DDL on its own; the rename,
+        # copy and drop must commit or roll back together
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        result = migrate_ohlcv(conn)
+    if result["migrated"] and vacuum:
+        # Hand the legacy table's pages back to the filesystem
+        get_connection(db_path).execute("VACUUM")
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate the market database to the current schema.")
+    parser.add_argument("--db", default=DB_PATH, help="Database to migrate (default: %(default)s)")
+    parser.add_argument("--no-vacuum", action="store_true", help="Skip the VACUUM after migrating")
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    result = migrate(args.db, vacuum=not args.no_vacuum)
+    if result["migrated"]:
+        print(
+            f"Migrated ohlcv: {result['rows_before']} rows -> {result['rows_after']} "
+            f"({result['dropped']} duplicate or unparseable dropped) in {time.perf_counter() - t0:.1f}s"
+        )
+    else:
+        print("ohlcv is already on the current schema.")
@@ -1,18 +1,76 @@
 # src/data/news.py
 
+import asyncio
+import hashlib
+import time
+import aiohttp
 import feedparser
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-import sqlite3
 from datetime import datetime
+from typing import Dict, List
+from src.data.db import get_connection, transaction, bulk_insert
+from src.data.sentiment import (
+    LOOKUP_CHUNK, init_sentiment_daily, news_day, news_text, score_texts, update_sentiment_daily,
+)
+from src.utils.ratelimit import AsyncTokenBucket
 
-def fetch_news(symbol):
+NEWS_URL = "https://feeds.finance.yahoo.com/rss/2.0/headline?s={symbol}&region=US&lang=en-US"
+NEWS_COLUMNS = ("symbol", "title", "summary", "published", "sentiment", "content_hash")
+DEFAULT_CONCURRENCY = 8
+# Requests per second across all symbols: be nice to Yahoo!
+DEFAULT_REQUESTS_PER_SECOND = 2.0
+
+def content_hash(symbol: str, title: str, summary: str) -> str:
+    """Stable key for a headline, so the same story is stored once per symbol."""
+    return hashlib.sha1(f"{symbol}\x1f{title}\x1f{summary}".encode("utf-8")).hexdigest()
+
+def init_news_table():
     """
-    Fetches recent news headlines for a given stock symbol using Yahoo Finance RSS.
-    Returns a list of dicts with keys: symbol, title, summary, published, sentiment.
+    Create the news and feed-state tables. Older news tables get a content_hash
+    column, duplicates already stored are dropped (keeping the first copy), and
+    a unique index makes further inserts idempotent.
+    """
+    with transaction() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS news (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                symbol TEXT,
+                title TEXT,
+                summary TEXT,
+                published TEXT,
+                sentiment REAL,
+                content_hash TEXT
+            )
+        """)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(news)")}
+        if "content_hash" not in columns:
+            conn.execute("ALTER TABLE news ADD COLUMN content_hash TEXT")
+        missing = conn.execute(
+            "SELECT id, symbol, title, summary FROM news WHERE content_hash IS NULL"
+        ).fetchall()
+        if missing:
+            conn.executemany(
+                "UPDATE news SET content_hash=? WHERE id=?",
+                [(content_hash(sym, title or "", summary or ""), id_) for id_, sym, title, summary in missing]
+            )
+            conn.execute("""
+                DELETE FROM news WHERE id NOT IN (SELECT MIN(id) FROM news GROUP BY content_hash)
+            """)
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_news_content_hash ON news (content_hash)")
+        # Validators from the last fetch of each symbol's feed, for conditional GETs
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS news_feed_state (
+                symbol TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                checked_at TEXT
+            )
+        """)
+
+def parse_entries(symbol, feed) -> List[Dict]:
+    """
+    Turn a parsed feed into news dicts with keys: symbol, title, summary, published, sentiment.
+    Sentiment is left as None; the sentiment stage scores stored headlines.
     """
-    url = f"https://feeds.finance.yahoo.com/rss/2.0/headline?s={symbol}&region=US&lang=en-US"
-    feed = feedparser.parse(url)
-    analyzer = SentimentIntensityAnalyzer()
     items = []
     for entry in feed.entries:
         title = entry.get("title", "")
@@ -24,46 +82,127 @@ def fetch_news(symbol):
             published = dt.isoformat()
         except Exception:
             published = ""
-        # Sentiment score
-        sentiment = analyzer.polarity_scores(title + " " + summary)["compound"]
         items.append({
             "symbol": symbol,
             "title": title,
             "summary": summary,
             "published": published,
-            "sentiment": sentiment
+            "sentiment": None
         })
     return items
 
-def store_news(items):
+def fetch_news(symbol):
+    """
+    Fetches recent news headlines for a given stock symbol using Yahoo Finance RSS.
+    Returns a list of dicts with keys: symbol, title, summary, published, sentiment.
+    """
+    feed = feedparser.parse(NEWS_URL.format(symbol=symbol))
+    items = parse_entries(symbol, feed)
+    scores = score_texts([news_text(item["title"], item["summary"]) for item in items])
+    for item, score in zip(items, scores):
+        item["sentiment"] = score
+    return items
+
+def store_news(items) -> int:
     """
     Stores news items (as list of dicts) in the news table of the local SQLite DB.
+    Headlines already stored are skipped; scored ones that are new are added to
+    sentiment_daily. Returns the number of new rows.
     """
     if not items:
-        return
-    conn = sqlite3.connect("local_db/market_data.db")
-    cur = conn.cursor()
-    # Create table if needed
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS news (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            symbol TEXT,
-            title TEXT,
-            summary TEXT,
-            published TEXT,
-            sentiment REAL
-        )
-    """)
+        return 0
+    init_news_table()
+    init_sentiment_daily()
+    rows = {}
     for item in items:
-        cur.execute("""
-            INSERT INTO news (symbol, title, summary, published, sentiment)
-            VALUES (?, ?, ?, ?, ?)
-        """, (
-            item["symbol"],
-            item["title"],
-            item["summary"],
-            item["published"],
-            item["sentiment"]
+        key = content_hash(item["symbol"], item["title"], item["summary"])
+        if key not in rows:
+            rows[key] = (item["symbol"], item["title"], item["summary"], item["published"], item["sentiment"], key)
+    with transaction() as conn:
+        stored = _stored_hashes(conn, list(rows))
+        new_rows = [row for key, row in rows.items() if key not in stored]
+        inserted = bulk_insert("news", NEWS_COLUMNS, new_rows, conflict="IGNORE", conn=conn)
+        update_sentiment_daily(conn, [
+            (symbol, news_day(published), 1, sentiment)
+            for symbol, _, _, published, sentiment, _ in new_rows if sentiment is not None
+        ])
+    return inserted
+
+def _stored_hashes(conn, hashes: List[str]) -> set:
+    stored = set()
+    for i in range(0, len(hashes), LOOKUP_CHUNK):
+        chunk = hashes[i:i + LOOKUP_CHUNK]
+        placeholder = ",".join(["?"] * len(chunk))
+        stored.update(row[0] for row in conn.execute(
+            f"SELECT content_hash FROM news WHERE content_hash IN ({placeholder})", chunk
         ))
-    conn.commit()
-    conn.close()
+    return stored
+
+async def _fetch_feed(session, symbol: str, state: Dict, limiter: AsyncTokenBucket, semaphore: asyncio.Semaphore):
+    """
+    Conditionally GET one symbol's feed. Returns (symbol, items, etag, last_modified);
+    items is None when the server answered 304 Not Modified.
+    """
+    headers = {}
+    if state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if state.get("last_modified"):
+        headers["If-Modified-Since"] = state["last_modified"]
+    async with semaphore:
+        await limiter.acquire()
+        async with session.get(NEWS_URL.format(symbol=symbol), headers=headers) as resp:
+            if resp.status == 304:
+                return symbol, None, state.get("etag"), state.get("last_modified")
+            resp.raise_for_status()
+            body = await resp.read()
+            etag, last_modified = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+    return symbol, parse_entries(symbol, feedparser.parse(body)), etag, last_modified
+
+async def _fetch_all(symbols: List[str], states: Dict, concurrency: int, requests_per_second: float):
+    limiter = AsyncTokenBucket(requests_per_second, capacity=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    timeout = aiohttp.ClientTimeout(total=30)
+    headers = {"User-Agent": f"feedparser/{feedparser.__version__} +https://github.com/kurtmckee/feedparser/"}
+    async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session:
+        tasks = [_fetch_feed(session, s, states.get(s, {}), limiter, semaphore) for s in symbols]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+def fetch_news_concurrently(symbols: List[str], concurrency: int = DEFAULT_CONCURRENCY,
+                            requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND) -> Dict:
+    """
+    Fetch every symbol's feed with asyncio, skipping feeds the server reports as
+    unchanged, and store only headlines not seen before.
+    Returns run stats: symbols fetched, not modified, failed, and new headlines stored.
+    """
+    init_news_table()
+    states = {
+        row[0]: {"etag": row[1], "last_modified": row[2]}
+        for row in get_connection().execute("SELECT symbol, etag, last_modified FROM news_feed_state")
+    }
+    t0 = time.perf_counter()
+    results = asyncio.run(_fetch_all(symbols, states, concurrency, requests_per_second))
+
+    stats = {"fetched": 0, "not_modified": 0, "failed": [], "new_items": 0}
+    items, feed_states = [], []
+    now = datetime.now().isoformat(timespec="seconds")
+    for symbol, result in zip(symbols, results):
+        if isinstance(result, Exception):
+            print(f"Error fetching news for {symbol}: {result}")
+            stats["failed"].append(symbol)
+            continue
+        _, entries, etag, last_modified = result
+        if entries is None:
+            stats["not_modified"] += 1
+        else:
+            stats["fetched"] += 1
+            items.extend(entries)
+        feed_states.append((symbol, etag, last_modified, now))
+
+    stats["new_items"] = store_news(items)
+    bulk_insert("news_feed_state", ("symbol", "etag", "last_modified", "checked_at"), feed_states, conflict="REPLACE")
+    stats["elapsed_sec"] = round(time.perf_counter() - t0, 3)
+    print(
+        f"News: {stats['fetched']} feeds fetched, {stats['not_modified']} not modified, "
+        f"{len(stats['failed'])} failed, {stats['new_items']} new headlines in {stats['elapsed_sec']}s"
+    )
+    return stats
@@ -0,0 +1,222 @@
+# src/data/sentiment.py
+
+# Score headline sentiment with VADER, separately from fetching
+import argparse
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Tuple
+
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+from src.data.db import get_connection, transaction, bulk_insert
+
+DEFAULT_BATCH_SIZE = 500
+# Below this many uncached texts a process pool costs more than it saves
+MIN_PARALLEL_TEXTS = 2000
+# SQLite host-parameter limit is far above this; keeps IN (...) lists reasonable
+LOOKUP_CHUNK = 900
+# Recency weighting for sentiment_daily: a headline's weight halves every this many days
+SENTIMENT_HALF_LIFE_DAYS = float(os.getenv("SENTIMENT_HALF_LIFE_DAYS", 7))
+
+_analyzer = None
+
+def _get_analyzer() -> SentimentIntensityAnalyzer:
+    """One analyzer per process; building it loads the VADER lexicon."""
+    global _analyzer
+    if _analyzer is None:
+        _analyzer = SentimentIntensityAnalyzer()
+    return _analyzer
+
+def _score_batch(texts: List[str]) -> List[float]:
+    analyzer = _get_analyzer()
+    return [analyzer.polarity_scores(text)["compound"] for text in texts]
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def news_text(title: str, summary: str) -> str:
+    """The text a headline is scored on."""
+    return (title or "") + " " + (summary or "")
+
+def init_sentiment_cache():
+    with transaction() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sentiment_cache (
+                text_hash TEXT PRIMARY KEY,
+                compound REAL NOT NULL
+            )
+        """)
+
+def _cached_scores(hashes: List[str]) -> Dict[str, float]:
+    conn = get_connection()
+    found = {}
+    for i in range(0, len(hashes), LOOKUP_CHUNK):
+        chunk = hashes[i:i + LOOKUP_CHUNK]
+        placeholder = ",".join(["?"] * len(chunk))
+        found.update(conn.execute(
+            f"SELECT text_hash, compound FROM sentiment_cache WHERE text_hash IN ({placeholder})", chunk
+        ).fetchall())
+    return found
+
+def score_texts(texts: List[str], workers: int = None, batch_size: int = DEFAULT_BATCH_SIZE) -> List[float]:
+    """
+    Return the VADER compound score for each text, in order.
+
+    Scores are memoized by text hash in the sentiment_cache table, so only texts
+    never seen before are scored. Large uncached sets are split into batches and
+    scored across a process pool, each worker reusing a single analyzer.
+    """
+    if not texts:
+        return []
+    init_sentiment_cache()
+    hashes = [text_hash(t) for t in texts]
+    scores = _cached_scores(list(set(hashes)))
+
+    todo = {}
+    for h, text in zip(hashes, texts):
+        if h not in scores:
+            todo[h] = text
+    if todo:
+        todo_hashes, todo_texts = list(todo.keys()), list(todo.values())
+        batches = [todo_texts[i:i + batch_size] for i in range(0, len(todo_texts), batch_size)]
+        if len(todo_texts) < MIN_PARALLEL_TEXTS or workers == 1:
+            results = [_score_batch(batch) for batch in batches]
+        else:
+            with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+                results = list(pool.map(_score_batch, batches))
+        new_scores = [score for batch in results for score in batch]
+        scores.update(zip(todo_hashes, new_scores))
+        bulk_insert("sentiment_cache", ("text_hash", "compound"), list(zip(todo_hashes, new_scores)))
+
+    return [scores[h] for h in hashes]
+
+def news_day(published: str) -> str:
+    """The day a headline counts towards; undated headlines count as today."""
+    return (published or "")[:10] or datetime.now().strftime("%Y-%m-%d")
+
+def init_sentiment_daily():
+    """
+    Create sentiment_daily: per symbol and day, the number and sum of scored
+    headlines, plus the time-decayed count and sum of everything up to that
+    day. The first time it is created it is filled from the news table.
+    """
+    with transaction() as conn:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='sentiment_daily'").fetchone():
+            return
+        conn.execute("""
+            CREATE TABLE sentiment_daily (
+                symbol TEXT NOT NULL,
+                day TEXT NOT NULL,
+                n INTEGER NOT NULL DEFAULT 0,
+                total REAL NOT NULL DEFAULT 0,
+                decayed_n REAL,
+                decayed_total REAL,
+                PRIMARY KEY (symbol, day)
+            ) WITHOUT ROWID
+        """)
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='news'").fetchone():
+            rows = conn.execute("SELECT symbol, published, sentiment FROM news WHERE sentiment IS NOT NULL")
+            update_sentiment_daily(conn, [(symbol, news_day(published), 1, score) for symbol, published, score in rows])
+
+def update_sentiment_daily(conn, deltas: Iterable[Tuple[str, str, int, float]]):
+    """
+    Apply (symbol, day, added headlines, added score) deltas inside the caller's
+    transaction. Counts and sums are adjusted in place; the decayed columns are
+    then recomputed for the touched symbols from the earliest touched day on.
+    """
+    by_key = {}
+    for symbol, day, dn, dtotal in deltas:
+        n, total = by_key.get((symbol, day), (0, 0.0))
+        by_key[(symbol, day)] = (n + dn, total + dtotal)
+    if not by_key:
+        return
+    conn.executemany("""
+        INSERT INTO sentiment_daily (symbol, day, n, total) VALUES (?, ?, ?, ?)
+        ON CONFLICT(symbol, day) DO UPDATE SET n = n + excluded.n, total = total + excluded.total
+    """, [(symbol, day, n, total) for (symbol, day), (n, total) in by_key.items()])
+
+    first_day = {}
+    for symbol, day in by_key:
+        first_day[symbol] = min(day, first_day.get(symbol, day))
+    updates = []
+    for symbol, since in first_day.items():
+        prev = conn.execute(
+            "SELECT day, decayed_n, decayed_total FROM sentiment_daily WHERE symbol=? AND day<? ORDER BY day DESC LIMIT 1",
+            (symbol, since),
+        ).fetchone()
+        prev_day, decayed_n, decayed_total = prev if prev else (None, 0.0, 0.0)
+        for day, n, total in conn.execute(
+            "SELECT day, n, total FROM sentiment_daily WHERE symbol=? AND day>=? ORDER BY day", (symbol, since)
+        ).fetchall():
+            if prev_day is not None:
+                weight = _decay(prev_day, day)
+                decayed_n, decayed_total = decayed_n * weight, decayed_total * weight
+            decayed_n, decayed_total = decayed_n + n, decayed_total + total
+            updates.append((decayed_n, decayed_total, symbol, day))
+            prev_day = day
+    conn.executemany("UPDATE sentiment_daily SET decayed_n=?, decayed_total=? WHERE symbol=? AND day=?", updates)
+
+def _decay(from_day: str, to_day: str) -> float:
+    days = (date.fromisoformat(to_day) - date.fromisoformat(from_day)).days
+    return 0.5 ** (days / SENTIMENT_HALF_LIFE_DAYS)
+
+def load_sentiment(symbols: List[str] = None) -> Dict[str, Dict[str, float]]:
+    """
+    {symbol: {"avg": mean score of all headlines, "decayed": recency-weighted mean,
+    "headlines": count}} from sentiment_daily in one query.
+    """
+    init_sentiment_daily()
+    # SQLite fills bare columns from the row holding MAX(day), i.e. the latest decayed state
+    query = """
+        SELECT symbol, SUM(n), SUM(total), decayed_n, decayed_total, MAX(day)
+        FROM sentiment_daily {where} GROUP BY symbol
+    """
+    conn = get_connection()
+    if symbols:
+        placeholder = ",".join(["?"] * len(symbols))
+        rows = conn.execute(query.format(where=f"WHERE symbol IN ({placeholder})"), list(symbols)).fetchall()
+    else:
+        rows = conn.execute(query.format(where="")).fetchall()
+    return {
+        symbol: {
+            "avg": total / n if n else None,
+            "decayed": decayed_total / decayed_n if decayed_n else None,
+            "headlines": n,
+        }
+        for symbol, n, total, decayed_n, decayed_total, _ in rows
+    }
+
+def score_pending_news(rescore: bool = False, workers: int = None) -> int:
+    """
+    Fill in news.sentiment for headlines that have not been scored yet (or for
+    every headline with `rescore`), keeping sentiment_daily in step.
+    Returns the number of rows scored.
+    """
+    init_sentiment_daily()
+    conn = get_connection()
+    where = "" if rescore else "WHERE sentiment IS NULL"
+    rows = conn.execute(f"SELECT id, symbol, title, summary, published, sentiment FROM news {where}").fetchall()
+    if not rows:
+        return 0
+    t0 = time.perf_counter()
+    scores = score_texts([news_text(row[2], row[3]) for row in rows], workers=workers)
+    with transaction() as conn:
+        conn.executemany(
+            "UPDATE news SET sentiment=? WHERE id=?",
+            [(score, row[0]) for score, row in zip(scores, rows)]
+        )
+        update_sentiment_daily(conn, [
+            (symbol, news_day(published), 0 if old is not None else 1, score - (old or 0.0))
+            for score, (_, symbol, _, _, published, old) in zip(scores, rows)
+        ])
+    print(f"Scored sentiment for {len(rows)} headlines in {time.perf_counter() - t0:.2f}s")
+    return len(rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score news sentiment.")
+    parser.add_argument("--rescore", action="store_true", help="Rescore every headline, not just new ones")
+    parser.add_argument("--workers", type=int, default=None, help="Scoring processes (default: all CPUs)")
+    args = parser.parse_args()
+    score_pending_news(rescore=args.rescore, workers=args.workers)
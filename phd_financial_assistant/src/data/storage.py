@@ -1,67 +1,128 @@
-import os
-import sqlite3
-from typing import List, Tuple
+from datetime import datetime
+from typing import Dict, List, Tuple
 
-# Define and ensure the local database directory exists
-DATA_DIR = os.path.join(os.path.dirname(__file__), "../../local_db")
-os.makedirs(DATA_DIR, exist_ok=True)
+from src.data.db import DATA_DIR, DB_PATH, get_connection, transaction, bulk_insert
+from src.data import columnar
+from src.data.freshness import ensure_freshness_schema
+from src.data.migrate import DEFAULT_TIMEFRAME, WATERMARKS_DDL
 
-# Path to the SQLite database file
-DB_PATH = os.path.join(DATA_DIR, "market_data.db")
+OHLCV_COLUMNS = ("symbol", "ts_epoch", "timeframe", "open", "high", "low", "close", "volume")
 
 
 def init_db(db_path=DB_PATH):
     """
-    Initialize the SQLite database with an OHLCV table.
+    Create the OHLCV and watermark tables, migrating an older ohlcv layout
+    onto the canonical schema (see src.data.migrate) if one is found, and the
+    indexes the freshness planner reads.
     """
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS ohlcv (
-            symbol TEXT,
-            timestamp TEXT,
-            open REAL,
-            high REAL,
-            low REAL,
-            close REAL,
-            volume INTEGER,
-            PRIMARY KEY (symbol, timestamp)
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    ensure_freshness_schema(db_path)
+    init_watermarks_table(db_path)
 
 
-def save_ohlcv(symbol: str, bars: List[Tuple], db_path=DB_PATH):
+def save_ohlcv(symbol: str, bars: List[Tuple], db_path=DB_PATH, timeframe: str = DEFAULT_TIMEFRAME):
     """
     Save a list of OHLCV bars to the database.
     Args:
         symbol (str): Stock symbol (e.g. 'AAPL')
         bars (List[Tuple]): List of bar objects from Alpaca
         db_path (str): Path to SQLite database
+        timeframe (str): Bar size, e.g. '1Day'
     """
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    rows = [(symbol, bar.t.isoformat(), bar.o, bar.h, bar.l, bar.c, bar.v) for bar in bars]
-    cursor.executemany('''
-        INSERT OR IGNORE INTO ohlcv (symbol, timestamp, open, high, low, close, volume)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', rows)
-    conn.commit()
-    conn.close()
+    rows = [(symbol, int(bar.t.timestamp()), timeframe, bar.o, bar.h, bar.l, bar.c, bar.v) for bar in bars]
+    with transaction(db_path) as conn:
+        bulk_insert("ohlcv", OHLCV_COLUMNS, rows, conn=conn)
+        if rows:
+            _advance_watermark(conn, symbol, min(r[1] for r in rows), max(r[1] for r in rows))
+    # Keep the columnar analytics copy of daily bars in step with the table (default database only)
+    if db_path == DB_PATH and timeframe == DEFAULT_TIMEFRAME:
+        try:
+            columnar.append_rows(symbol, rows)
+        except Exception as e:
+            print(f"Columnar store update failed for {symbol} (rebuild with src.data.columnar --rebuild): {e}")
 
-def init_news_table(db_path=DB_PATH):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS news (
-            symbol TEXT,
-            headline TEXT,
-            summary TEXT,
-            published_at TEXT,
-            sentiment REAL,
-            PRIMARY KEY (symbol, headline)
+def init_watermarks_table(db_path=DB_PATH):
+    """
+    Create the per-symbol OHLCV watermark table (first/last bar as epoch seconds).
+    On first creation it is seeded from whatever is already in ohlcv, so
+    existing databases keep their history.
+    """
+    with transaction(db_path) as conn:
+        conn.execute(WATERMARKS_DDL)
+        if conn.execute("SELECT COUNT(*) FROM ohlcv_watermarks").fetchone()[0] == 0:
+            conn.execute('''
+                INSERT INTO ohlcv_watermarks (symbol, first_epoch, last_epoch, updated_at)
+                SELECT symbol, MIN(ts_epoch), MAX(ts_epoch), ? FROM ohlcv GROUP BY symbol
+            ''', (datetime.now().isoformat(timespec="seconds"),))
+
+def _advance_watermark(conn, symbol: str, first_epoch: int, last_epoch: int):
+    conn.execute('''
+        INSERT INTO ohlcv_watermarks (symbol, first_epoch, last_epoch, updated_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(symbol) DO UPDATE SET
+            first_epoch = MIN(first_epoch, excluded.first_epoch),
+            last_epoch = MAX(last_epoch, excluded.last_epoch),
+            updated_at = excluded.updated_at
+    ''', (symbol, first_epoch, last_epoch, datetime.now().isoformat(timespec="seconds")))
+
+def get_watermarks(db_path=DB_PATH) -> Dict[str, int]:
+    """
+    Return {symbol: last stored bar as epoch seconds} for every symbol with bars.
+    """
+    cursor = get_connection(db_path).execute("SELECT symbol, last_epoch FROM ohlcv_watermarks")
+    return dict(cursor.fetchall())
+
+def get_latest_prices(symbols: List[str], db_path=DB_PATH) -> Dict[str, float]:
+    """
+    Return {symbol: latest stored close} for `symbols`, in one query: each
+    symbol is a single backward seek on the (symbol, ts_epoch) primary key.
+    Symbols without bars are left out.
+    """
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return {}
+    values = ",".join(["(?)"] * len(symbols))
+    cursor = get_connection(db_path).execute(
+        f"""
+        WITH wanted(symbol) AS (VALUES {values})
+        SELECT symbol, (SELECT close FROM ohlcv o WHERE o.symbol = wanted.symbol ORDER BY ts_epoch DESC LIMIT 1)
+        FROM wanted
+        """,
+        symbols,
+    )
+    return {symbol: close for symbol, close in cursor if close is not None}
+
+def find_ohlcv_gaps(symbols: List[str] = None, max_gap_days: float = 5.0, db_path=DB_PATH) -> List[Tuple[str, int, int]]:
+    """
+    Find holes in stored bars: consecutive bars more than `max_gap_days` calendar
+    days apart (longer than any weekend + holiday).
+    Returns (symbol, after_epoch, before_epoch).
+    """
+    conn = get_connection(db_path)
+    query = '''
+        SELECT symbol, prev_ts, ts_epoch FROM (
+            SELECT symbol, ts_epoch,
+                   LAG(ts_epoch) OVER (PARTITION BY symbol ORDER BY ts_epoch) AS prev_ts
+            FROM ohlcv {where}
         )
-    ''')
-    conn.commit()
-    conn.close()
+        WHERE prev_ts IS NOT NULL AND ts_epoch - prev_ts > ?
+    '''
+    max_gap = max_gap_days * 86400
+    if symbols:
+        placeholder = ",".join(["?"] * len(symbols))
+        cursor = conn.execute(query.format(where=f"WHERE symbol IN ({placeholder})"), (*symbols, max_gap))
+    else:
+        cursor = conn.execute(query.format(where=""), (max_gap,))
+    return cursor.fetchall()
+
+def init_news_table(db_path=DB_PATH):
+    with transaction(db_path) as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS news (
+                symbol TEXT,
+                headline TEXT,
+                summary TEXT,
+                published_at TEXT,
+                sentiment REAL,
+                PRIMARY KEY (symbol, headline)
+            )
+        ''')
@@ -0,0 +1,237 @@
+# src/pipeline.py
+
+# Daily refresh as a dependency graph: independent stages run side by side,
+# stages whose inputs have not changed since their last success are skipped,
+# and every stage run is recorded in the pipeline_runs table.
+import argparse
+import hashlib
+import os
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from src.data.db import DB_PATH, get_connection, transaction, bulk_insert
+from src.data.freshness import build_refresh_plan, ensure_freshness_schema
+from src.strategy.models import MODELS, artifact_path
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+# Stage logs live next to the database they were run against
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "pipeline_logs")
+DEFAULT_WORKERS = 4
+# Stage statuses; FAILED_STATUSES stop everything downstream
+OK, SKIPPED, FAILED, UPSTREAM_FAILED = "ok", "skipped", "failed", "upstream_failed"
+FAILED_STATUSES = (FAILED, UPSTREAM_FAILED)
+
+
+class Stage(NamedTuple):
+    """
+    One step of the pipeline, run as `python -m <module> <args>`.
+    `inputs` returns a fingerprint of what the stage would consume: the stage is
+    skipped if it matches the last successful run, or if it is None (nothing to
+    do). Stages without `inputs` always run. Row counts of `tables` are taken
+    before and after to record how many rows the stage added.
+    """
+    name: str
+    module: str
+    deps: Tuple[str, ...] = ()
+    inputs: Optional[Callable[[], Optional[str]]] = None
+    tables: Tuple[str, ...] = ()
+    args: Tuple[str, ...] = ()
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha1("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+def _today() -> str:
+    return datetime.now().strftime("%Y-%m-%d")
+
+def _stale(key: str) -> Callable[[], Optional[str]]:
+    """Fingerprint for an ingestion stage: today's list of stale symbols, or None if there are none."""
+    def fingerprint():
+        symbols = build_refresh_plan()[key]
+        return _digest(_today(), *symbols) if symbols else None
+    return fingerprint
+
+def _data_version() -> str:
+    """Cheap summary of the stored market data; changes whenever any ingestion stage writes."""
+    conn = get_connection()
+    parts = []
+    for sql in (
+        "SELECT COUNT(*), MAX(ts_epoch) FROM ohlcv",
+        "SELECT COUNT(*), MAX(id), COUNT(sentiment) FROM news",
+        "SELECT COUNT(*), MAX(fetched_at) FROM fundamentals",
+    ):
+        try:
+            parts.extend(conn.execute(sql).fetchone())
+        except Exception:
+            parts.append(None)
+    return _digest(*parts)
+
+def _models_version() -> str:
+    paths = [artifact_path(name) for name in MODELS]
+    return _digest(*(path and os.path.getmtime(path) for path in paths))
+
+def default_stages(email: bool = False) -> List[Stage]:
+    return [
+        Stage("universe", "src.sp500_loader", inputs=_today, tables=("fundamentals",)),
+        Stage("fundamentals", "src.data.fundamentals_main", ("universe",), _stale("fundamentals"), ("fundamentals",)),
+        Stage("ohlcv", "src.data.collector_main", ("universe",), _stale("ohlcv"), ("ohlcv",)),
+        Stage("news", "src.data.news_main", ("universe",), _stale("news"), ("news",)),
+        Stage(
+            "features", "src.strategy.features", ("fundamentals", "ohlcv", "news"),
+            lambda: _digest(_today(), _data_version()), ("features_daily",),
+        ),
+        Stage("train", "src.strategy.train_model", ("features",), _data_version),
+        Stage(
+            "strategy", "src.strategy.run_strategy", ("train",),
+            lambda: _digest(_today(), _data_version(), _models_version(), email),
+            args=("--email",) if email else (),
+        ),
+    ]
+
+def init_run_log():
+    with transaction() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS pipeline_runs (
+                run_id TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                status TEXT NOT NULL,
+                started_at TEXT,
+                wall_sec REAL,
+                rows_written INTEGER,
+                fingerprint TEXT,
+                error TEXT,
+                PRIMARY KEY (run_id, stage)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_pipeline_runs_stage ON pipeline_runs (stage, status, run_id)")
+
+def new_run_id() -> str:
+    """Time-ordered (sorts by start) and unique, even for runs started in the same second."""
+    return f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+
+def _last_fingerprint(stage: str) -> Optional[str]:
+    row = get_connection().execute(
+        "SELECT fingerprint FROM pipeline_runs WHERE stage=? AND status=? ORDER BY run_id DESC LIMIT 1",
+        (stage, OK),
+    ).fetchone()
+    return row[0] if row else None
+
+def _row_count(tables: Tuple[str, ...]) -> int:
+    conn = get_connection()
+    total = 0
+    for table in tables:
+        try:
+            total += conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        except Exception:
+            pass
+    return total
+
+def _log(run_id: str, stage: str, status: str, started_at: str = None, wall_sec: float = None,
+         rows_written: int = None, fingerprint: str = None, error: str = None):
+    bulk_insert(
+        "pipeline_runs",
+        ("run_id", "stage", "status", "started_at", "wall_sec", "rows_written", "fingerprint", "error"),
+        [(run_id, stage, status, started_at, wall_sec, rows_written, fingerprint, error)],
+        conflict="REPLACE",
+    )
+
+def _run_stage(run_id: str, stage: Stage, force: bool) -> str:
+    started_at = datetime.now().isoformat(timespec="seconds")
+    t0 = time.perf_counter()
+    fingerprint = None
+    try:
+        if stage.inputs is not None:
+            fingerprint = stage.inputs()
+            if not force and (fingerprint is None or fingerprint == _last_fingerprint(stage.name)):
+                reason = "nothing to do" if fingerprint is None else "inputs unchanged"
+                print(f"[{stage.name}] skipped: {reason}")
+                _log(run_id, stage.name, SKIPPED, started_at, 0.0, 0, fingerprint)
+                return SKIPPED
+
+        print(f"[{stage.name}] started")
+        rows_before = _row_count(stage.tables)
+        os.makedirs(LOG_DIR, exist_ok=True)
+        log_path = os.path.join(LOG_DIR, f"{run_id}_{stage.name}.log")
+        with open(log_path, "w") as log_file:
+            result = subprocess.run(
+                [sys.executable, "-m", stage.module, *stage.args],
+                cwd=PROJECT_ROOT, stdout=log_file, stderr=subprocess.STDOUT,
+            )
+        wall_sec = round(time.perf_counter() - t0, 3)
+        rows_written = _row_count(stage.tables) - rows_before
+        if result.returncode != 0:
+            with open(log_path) as log_file:
+                tail = log_file.read()[-2000:]
+            print(f"[{stage.name}] FAILED (exit {result.returncode}) after {wall_sec}s, see {log_path}")
+            _log(run_id, stage.name, FAILED, started_at, wall_sec, rows_written, fingerprint, tail)
+            return FAILED
+        print(f"[{stage.name}] done in {wall_sec}s, {rows_written} new rows")
+        _log(run_id, stage.name, OK, started_at, wall_sec, rows_written, fingerprint)
+        return OK
+    except Exception as e:
+        wall_sec = round(time.perf_counter() - t0, 3)
+        print(f"[{stage.name}] FAILED: {e}")
+        _log(run_id, stage.name, FAILED, started_at, wall_sec, None, fingerprint, repr(e))
+        return FAILED
+
+def run_pipeline(stages: List[Stage] = None, force: bool = False, max_workers: int = DEFAULT_WORKERS) -> Dict[str, str]:
+    """
+    Run `stages` as a DAG: each stage starts as soon as all of its dependencies
+    have succeeded or been skipped, up to `max_workers` at a time. A failed
+    stage marks everything downstream as upstream_failed; unrelated branches
+    carry on. With `force`, no stage is skipped. Returns {stage: status}.
+    """
+    stages = stages if stages is not None else default_stages()
+    by_name = {s.name: s for s in stages}
+    for stage in stages:
+        unknown = [d for d in stage.deps if d not in by_name]
+        if unknown:
+            raise ValueError(f"Stage {stage.name} depends on unknown stage(s): {', '.join(unknown)}")
+    init_run_log()
+    # Schema and index setup once, up front: stage fingerprints only read
+    ensure_freshness_schema()
+    run_id = new_run_id()
+    t0 = time.perf_counter()
+
+    status, pending, running = {}, dict(by_name), {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if any(status.get(d) in FAILED_STATUSES for d in stage.deps):
+                    print(f"[{name}] not run: upstream failure")
+                    _log(run_id, name, UPSTREAM_FAILED)
+                    status[name] = UPSTREAM_FAILED
+                    del pending[name]
+                elif all(d in status for d in stage.deps):
+                    running[pool.submit(_run_stage, run_id, stage, force)] = name
+                    del pending[name]
+            if not running:
+                if pending:
+                    raise ValueError(f"Dependency cycle among stages: {', '.join(pending)}")
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                status[running.pop(future)] = future.result()
+
+    print(f"Pipeline run {run_id} finished in {time.perf_counter() - t0:.1f}s: "
+          + ", ".join(f"{name}={s}" for name, s in status.items()))
+    return status
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the daily data refresh, training and strategy.")
+    parser.add_argument("--email", action="store_true", help="Email the daily picks from the strategy stage")
+    parser.add_argument("--force", action="store_true", help="Run every stage even if its inputs are unchanged")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Stages run at once")
+    parser.add_argument("--only", nargs="+", help="Run just these stages (dependencies are assumed done)")
+    args = parser.parse_args()
+
+    stages = default_stages(email=args.email)
+    if args.only:
+        stages = [s._replace(deps=tuple(d for d in s.deps if d in args.only)) for s in stages if s.name in args.only]
+    result = run_pipeline(stages, force=args.force, max_workers=args.workers)
+    sys.exit(1 if any(s in FAILED_STATUSES for s in result.values()) else 0)
@@ -1,22 +1,14 @@
-import sqlite3
+from src.data.db import DB_PATH, transaction
+from src.data.storage import init_db
 
 def create_all_tables():
-    conn = sqlite3.connect("local_db/market_data.db")
-    cur = conn.cursor()
+    # OHLCV and its watermarks have one canonical schema, owned by storage/migrate
+    init_db(DB_PATH)
+    with transaction(DB_PATH) as conn:
+        _create_tables(conn.cursor())
+    print("All tables created or verified.")
 
-    # OHLCV table
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS ohlcv (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            symbol TEXT,
-            timestamp TEXT,
-            open REAL,
-            high REAL,
-            low REAL,
-            close REAL,
-            volume INTEGER
-        )
-    """)
+def _create_tables(cur):
 
     # Fundamentals table
     cur.execute("""
@@ -27,7 +19,8 @@ def create_all_tables():
             dividend_yield REAL,
             market_cap REAL,
             sector TEXT,
-            industry TEXT
+            industry TEXT,
+            fetched_at TEXT
         )
     """)
 
@@ -39,7 +32,8 @@ def create_all_tables():
             title TEXT,
             summary TEXT,
             published TEXT,
-            sentiment REAL
+            sentiment REAL,
+            content_hash TEXT
         )
     """)
 
@@ -54,9 +48,5 @@ def create_all_tables():
         )
     """)
 
-    conn.commit()
-    conn.close()
-    print("All tables created or verified.")
-
 if __name__ == "__main__":
     create_all_tables()
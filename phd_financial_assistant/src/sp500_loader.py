@@ -1,7 +1,7 @@
 # src/sp500_loader.py
 
 import yfinance as yf
-import sqlite3
+from src.data.db import DB_PATH, transaction
 
 def fetch_sp500_symbols():
     # Try yfinance method for S&P 500 components first
@@ -17,26 +17,23 @@ def fetch_sp500_symbols():
     table = [s for s in table if not str(s).startswith('^')]
     return table
 
-def upsert_symbols_to_db(symbols, db_path="local_db/market_data.db"):
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS fundamentals (
-            symbol TEXT PRIMARY KEY,
-            pe_ratio REAL,
-            dividend_yield REAL,
-            market_cap REAL,
-            sector TEXT,
-            industry TEXT
-        )
-    """)
-    for symbol in symbols:
-        cur.execute("""
+def upsert_symbols_to_db(symbols, db_path=DB_PATH):
+    with transaction(db_path) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS fundamentals (
+                symbol TEXT PRIMARY KEY,
+                pe_ratio REAL,
+                dividend_yield REAL,
+                market_cap REAL,
+                sector TEXT,
+                industry TEXT,
+                fetched_at TEXT
+            )
+        """)
+        conn.executemany("""
             INSERT OR IGNORE INTO fundamentals (symbol)
             VALUES (?)
-        """, (symbol,))
-    conn.commit()
-    conn.close()
+        """, [(symbol,) for symbol in symbols])
     print(f"Added/ensured {len(symbols)} symbols in fundamentals table.")
 
 if __name__ == "__main__":
@@ -0,0 +1,165 @@
+# src/strategy/allocation.py
+
+# Risk-aware portfolio weights from a shrinkage covariance of daily returns:
+# risk parity, minimum variance and score-tilted mean-variance, long-only with
+# a per-position cap. Everything is dense NumPy on (symbols x days) matrices.
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.data.columnar import load_matrix
+from src.data.db import get_connection
+
+METHODS = ("risk_parity", "min_variance", "mean_variance")
+DEFAULT_LOOKBACK = 252
+# Symbols with fewer daily returns than this in the lookback are left out
+MIN_HISTORY = 60
+# Score-tilted mean-variance: expected return = z-scored score * typical daily vol * TILT
+SCORE_TILT = 0.1
+RISK_AVERSION = 1.0
+MAX_ITER = 500
+TOLERANCE = 1e-10
+
+# (as_of, lookback, symbols) -> (symbols with enough history, covariance)
+_cov_cache: "OrderedDict[Tuple, Tuple[List[str], np.ndarray]]" = OrderedDict()
+_COV_CACHE_ENTRIES = 32
+_lock = threading.Lock()
+
+def ledoit_wolf(returns: np.ndarray) -> np.ndarray:
+    """
+    Ledoit-Wolf shrinkage covariance of a (days x assets) return matrix:
+    the sample covariance pulled toward a scaled identity by the optimal
+    intensity of Ledoit & Wolf (2004). NaN returns count as the asset mean.
+    """
+    x = returns - np.nanmean(returns, axis=0)
+    x = np.nan_to_num(x)
+    t, n = x.shape
+    sample = x.T @ x / t
+    mu = np.trace(sample) / n
+    target = mu * np.eye(n)
+    d2 = np.sum((sample - target) ** 2) / n
+    # Average squared distance of the single-day outer products from the sample covariance
+    b2 = (np.sum((x ** 2).T @ (x ** 2)) / t - np.sum(sample ** 2)) / (n * t)
+    b2 = min(b2, d2)
+    shrinkage = b2 / d2 if d2 > 0 else 1.0
+    return shrinkage * target + (1 - shrinkage) * sample
+
+def _as_of() -> Optional[int]:
+    try:
+        return get_connection().execute("SELECT MAX(last_epoch) FROM ohlcv_watermarks").fetchone()[0]
+    except Exception:
+        return None
+
+def covariance(symbols: Sequence[str], lookback: int = DEFAULT_LOOKBACK) -> Tuple[List[str], np.ndarray]:
+    """
+    Shrinkage covariance of daily returns over the last `lookback` trading days.
+    Returns (the symbols with at least MIN_HISTORY returns, their covariance).
+    Cached per (latest bar, lookback, symbol set), so it is computed once a day.
+    """
+    key = (_as_of(), lookback, tuple(symbols))
+    with _lock:
+        if key in _cov_cache:
+            _cov_cache.move_to_end(key)
+            return _cov_cache[key]
+    closes = load_matrix(list(symbols), fields=("close",))["close"][:, -(lookback + 1):]
+    returns = closes[:, 1:] / closes[:, :-1] - 1
+    keep = np.sum(~np.isnan(returns), axis=1) >= MIN_HISTORY
+    kept = [s for s, k in zip(symbols, keep) if k]
+    cov = ledoit_wolf(returns[keep].T) if kept else np.zeros((0, 0))
+    with _lock:
+        _cov_cache[key] = (kept, cov)
+        while len(_cov_cache) > _COV_CACHE_ENTRIES:
+            _cov_cache.popitem(last=False)
+    return kept, cov
+
+def project_capped_simplex(v: np.ndarray, cap: float) -> np.ndarray:
+    """Euclidean projection of `v` onto {w : 0 <= w <= cap, sum(w) = 1} (bisection on the shift)."""
+    lo, hi = v.min() - cap, v.max()
+    for _ in range(60):
+        tau = (lo + hi) / 2
+        if np.clip(v - tau, 0, cap).sum() > 1:
+            lo = tau
+        else:
+            hi = tau
+    return np.clip(v - (lo + hi) / 2, 0, cap)
+
+def _projected_ascent(cov: np.ndarray, mu: np.ndarray, risk_aversion: float, cap: float) -> np.ndarray:
+    """Maximize mu.w - risk_aversion/2 * w'Cw over the capped simplex."""
+    n = len(mu)
+    step = 1.0 / (risk_aversion * np.linalg.eigvalsh(cov)[-1])
+    w = project_capped_simplex(np.full(n, 1.0 / n), cap)
+    for _ in range(MAX_ITER):
+        new = project_capped_simplex(w + step * (mu - risk_aversion * cov @ w), cap)
+        if np.sum((new - w) ** 2) < TOLERANCE:
+            return new
+        w = new
+    return w
+
+def _inverse_volatility(cov: np.ndarray) -> np.ndarray:
+    vol = np.sqrt(np.clip(np.diag(cov), 0, None))
+    inv = np.divide(1.0, vol, out=np.zeros_like(vol), where=vol > 0)
+    return inv / inv.sum() if inv.sum() > 0 else np.full(len(vol), 1.0 / len(vol))
+
+def _risk_parity(cov: np.ndarray, cap: float) -> np.ndarray:
+    """
+    Weights whose risk contributions w_i (Cw)_i are equal: minimize
+    0.5 w'Cw - (1/n) sum(log w) by cyclical coordinate descent, then normalize.
+    Each step is the positive root of a quadratic in w_i, so weights stay
+    positive with negatively correlated assets too. Falls back to
+    inverse-volatility weights if the solve fails.
+    """
+    n = cov.shape[0]
+    diag = np.diag(cov)
+    w = _inverse_volatility(cov)
+    with np.errstate(all="ignore"):
+        for _ in range(MAX_ITER):
+            previous = w.copy()
+            for i in range(n):
+                c = cov[i] @ w - diag[i] * w[i]
+                w[i] = (np.sqrt(c * c + 4 * diag[i] / n) - c) / (2 * diag[i])
+            if np.max(np.abs(w - previous)) < TOLERANCE * np.max(w):
+                break
+        w = w / w.sum()
+    if not np.all(np.isfinite(w)) or np.any(w < 0):
+        w = _inverse_volatility(cov)
+    return project_capped_simplex(w, cap) if w.max() > cap else w
+
+def optimize(cov: np.ndarray, method: str, scores: np.ndarray = None, cap: float = 1.0) -> np.ndarray:
+    """Long-only weights summing to 1, none above `cap`, for one of METHODS."""
+    n = cov.shape[0]
+    cap = max(cap, 1.0 / n)
+    if method == "risk_parity":
+        return _risk_parity(cov, cap)
+    if method == "min_variance":
+        return _projected_ascent(cov, np.zeros(n), 1.0, cap)
+    if method == "mean_variance":
+        spread = scores.std()
+        z = (scores - scores.mean()) / spread if spread > 0 else np.zeros(n)
+        mu = z * np.sqrt(np.mean(np.diag(cov))) * SCORE_TILT
+        return _projected_ascent(cov, mu, RISK_AVERSION, cap)
+    raise ValueError(f"Unknown allocation method {method!r}; expected one of {', '.join(METHODS)}")
+
+def allocate_weights(ranked: List[Dict], method: str, positions: int = 5, max_weight: float = None,
+                     candidates: int = None, lookback: int = DEFAULT_LOOKBACK) -> Dict[str, float]:
+    """
+    {symbol: weight} for the best `positions` names. The optimizer first runs
+    over the top `candidates` ranked stocks (default: 4x positions), then again
+    over the `positions` names it weighted most. Weights are capped at
+    `max_weight` (default: twice an equal weight, at most 1). Returns {} if no
+    candidate has enough price history.
+    """
+    max_weight = max_weight or min(1.0, 2.0 / positions)
+    pool = ranked[: candidates or 4 * positions]
+    scores_by_symbol = {s["symbol"]: s["score"] for s in pool}
+    symbols, cov = covariance([s["symbol"] for s in pool], lookback)
+    if not symbols:
+        return {}
+    scores = np.array([scores_by_symbol[s] for s in symbols], dtype=float)
+    weights = optimize(cov, method, scores, max_weight)
+    if len(symbols) > positions:
+        top = np.sort(np.argsort(-weights, kind="stable")[:positions])
+        weights = optimize(cov[np.ix_(top, top)], method, scores[top], max_weight)
+        symbols = [symbols[i] for i in top]
+    return {s: float(w) for s, w in zip(symbols, weights) if w > 1e-6}
@@ -0,0 +1,245 @@
+# src/strategy/backtest.py
+
+# Historical replay of the selection strategy (filter_and_score + allocate_portfolio)
+# on the stored price matrix. Holdings, drift, turnover and the equity curve are
+# computed as (symbols x days) array operations; only covariance-based
+# allocation loops, once per rebalance date.
+import argparse
+import time
+from itertools import groupby
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.data.columnar import load_matrix
+from src.data.db import get_connection
+from src.strategy.allocation import DEFAULT_LOOKBACK, MIN_HISTORY, ledoit_wolf, optimize
+from src.strategy.engine import MAX_PE_RATIO, MIN_DIVIDEND_YIELD, score_candidates
+from src.strategy.features import FEATURE_FIELDS, FEATURE_SET_VERSION, load_features
+
+TRADING_DAYS = 252
+FREQUENCIES = ("D", "W", "M", "Q")
+
+def performance_metrics(values: np.ndarray) -> Optional[Dict]:
+    """Return, volatility and Sharpe ratio of a daily value series, as get_portfolio_performance reports them."""
+    values = np.asarray(values, dtype=float)
+    if len(values) < 2:
+        return None
+    daily_returns = np.diff(values) / values[:-1]
+    total_return = (values[-1] - values[0]) / values[0]
+    avg_daily_return = np.mean(daily_returns)
+    volatility = np.std(daily_returns)
+    sharpe = avg_daily_return / volatility * np.sqrt(TRADING_DAYS) if volatility > 0 else 0
+    return {
+        "total_return": round(total_return * 100, 2),
+        "annual_volatility": round(volatility * np.sqrt(TRADING_DAYS) * 100, 2),
+        "sharpe_ratio": round(sharpe, 2),
+        "start_value": round(values[0], 2),
+        "end_value": round(values[-1], 2),
+        "num_days": len(values),
+    }
+
+def forward_fill(matrix: np.ndarray) -> np.ndarray:
+    """Carry each row's last non-NaN value forward along the columns."""
+    idx = np.where(np.isnan(matrix), 0, np.arange(matrix.shape[1]))
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    return np.take_along_axis(matrix, idx, axis=1)
+
+def rebalance_days(dates: np.ndarray, frequency="M") -> np.ndarray:
+    """
+    Column indices of the rebalance dates: the first trading day of every
+    day/week/month/quarter ("D", "W", "M", "Q"), or every `frequency` bars if
+    it is an int.
+    """
+    if isinstance(frequency, int) or str(frequency).isdigit():
+        return np.arange(0, len(dates), int(frequency))
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Unknown rebalance frequency {frequency!r}; expected one of {', '.join(FREQUENCIES)} or a bar count")
+    days = dates.astype("datetime64[D]").astype(np.int64)
+    if frequency == "D":
+        period = days
+    elif frequency == "W":
+        period = (days + 3) // 7  # 1970-01-01 was a Thursday; weeks start on Monday
+    else:
+        months = dates.astype("datetime64[M]").astype(np.int64)
+        period = months if frequency == "M" else months // 3
+    return np.flatnonzero(np.r_[True, np.diff(period) != 0])
+
+def snapshot_scores(symbols: List[str], version: int = FEATURE_SET_VERSION, max_pe: float = MAX_PE_RATIO,
+                    min_dividend_yield: float = MIN_DIVIDEND_YIELD) -> Dict:
+    """
+    Model scores of every stored feature snapshot, scored in one batch per
+    snapshot with the given filter thresholds. Returns {"dates": snapshot
+    dates as datetime64[D], "score", "rank", "pe_ratio", "dividend_yield"},
+    the matrices being (symbols x snapshots). Stocks the filters reject get
+    NaN score and -inf rank; the rank is xgb_score, as filter_and_score sorts.
+    """
+    load_features(build=True, version=version)
+    rows = get_connection().execute(
+        f"SELECT as_of, {', '.join(FEATURE_FIELDS)} FROM features_daily WHERE version=? ORDER BY as_of, symbol",
+        (version,),
+    ).fetchall()
+    as_of = sorted({row[0] for row in rows})
+    position = {s: i for i, s in enumerate(symbols)}
+    column = {d: j for j, d in enumerate(as_of)}
+    shape = (len(symbols), len(as_of))
+    out = {
+        "dates": np.array(as_of, dtype="datetime64[D]"),
+        "score": np.full(shape, np.nan),
+        "rank": np.full(shape, -np.inf),
+        "pe_ratio": np.full(shape, np.nan),
+        "dividend_yield": np.full(shape, np.nan),
+    }
+    for day, group in groupby(rows, key=lambda row: row[0]):
+        stocks = [dict(zip(FEATURE_FIELDS, row[1:])) for row in group if row[1] in position]
+        j = column[day]
+        for stock in stocks:
+            i = position[stock["symbol"]]
+            for field in ("pe_ratio", "dividend_yield"):
+                if stock[field] is not None:
+                    out[field][i, j] = stock[field]
+        for stock in score_candidates(stocks, max_pe, min_dividend_yield):
+            i = position[stock["symbol"]]
+            out["score"][i, j] = stock["score"]
+            if stock["xgb_score"] is not None:
+                out["rank"][i, j] = stock["xgb_score"]
+    return out
+
+def top_k(ranks: np.ndarray, positions: int):
+    """
+    Row indices of the best `positions` ranks in each column (NaN = not
+    eligible, sorted last), and whether each pick is eligible. lexsort is
+    stable, keeping filter_and_score's tie order.
+    """
+    ineligible = np.isnan(ranks)
+    order = np.lexsort((np.where(ineligible, 0.0, -ranks), ineligible), axis=0)[:positions]
+    return order, np.take_along_axis(~ineligible, order, axis=0)
+
+def score_weights(scores: np.ndarray, order: np.ndarray, eligible: np.ndarray) -> np.ndarray:
+    """allocate_portfolio's "score" split for every rebalance: each pick's score over the picks' total."""
+    weights = np.zeros(scores.shape)
+    picked = np.where(eligible, np.take_along_axis(scores, order, axis=0), 0.0)
+    total = picked.sum(axis=0)
+    np.put_along_axis(weights, order, picked / np.where(total == 0, 1.0, total), axis=0)
+    return weights
+
+def simulate(prices: np.ndarray, weights: np.ndarray, rebalances: np.ndarray,
+             initial_value: float = 1000.0, cost_bps: float = 0.0):
+    """
+    Equity curve and per-rebalance one-way turnover of holding `weights`
+    (symbols x rebalances) from each rebalance day to the next, on
+    forward-filled `prices` (symbols x days). Unallocated weight is cash.
+    """
+    cash = 1.0 - weights.sum(axis=0)
+    # Each day's value relative to the last rebalance before it, then chained across segments
+    segment = np.clip(np.searchsorted(rebalances, np.arange(prices.shape[1]), side="left") - 1, 0, None)
+    segment[0] = 0
+    anchor = prices[:, rebalances[segment]]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        relative = np.where(weights[:, segment] != 0, prices / anchor, 0.0)
+    growth = np.nansum(weights[:, segment] * relative, axis=0) + cash[segment]
+    growth[0] = 1.0
+
+    # Drifted weights just before each rebalance give turnover and costs
+    ends = rebalances[1:]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        before = weights[:, :-1] * np.nan_to_num(prices[:, ends] / prices[:, rebalances[:-1]])
+    before = before / np.maximum(growth[ends], 1e-12)
+    drifted = np.concatenate([np.zeros((weights.shape[0], 1)), before], axis=1)
+    traded_weight = np.abs(weights - drifted).sum(axis=0)
+    cost = 1.0 - traded_weight * cost_bps / 1e4
+    base = initial_value * np.cumprod(np.r_[1.0, growth[ends]] * cost)
+    equity = base[segment] * growth
+    equity[rebalances] = base
+    return equity, traded_weight / 2
+
+def _covariance_weights(closes: np.ndarray, picks: np.ndarray, scores: np.ndarray, day: int,
+                        method: str, max_weight: float, lookback: int) -> np.ndarray:
+    """Optimizer weights for one rebalance, from the returns up to and including `day`."""
+    window = closes[picks, max(0, day - lookback): day + 1]
+    returns = window[:, 1:] / window[:, :-1] - 1
+    ok = np.sum(~np.isnan(returns), axis=1) >= MIN_HISTORY
+    weights = np.zeros(len(picks))
+    if ok.sum() >= 2:
+        weights[ok] = optimize(ledoit_wolf(returns[ok].T), method, scores[ok], max_weight)
+    elif ok.any():
+        weights[ok] = 1.0
+    return weights
+
+def run_backtest(start: str = None, end: str = None, frequency="M", positions: int = 5,
+                 method: str = "score", max_weight: float = None, initial_value: float = 1000.0,
+                 cost_bps: float = 0.0, symbols: List[str] = None, lookback: int = DEFAULT_LOOKBACK) -> Optional[Dict]:
+    """
+    Replay the strategy from `start` to `end` (ISO dates; default: all stored
+    bars). On each rebalance date the stocks with a close that day are ranked
+    by the latest feature snapshot on or before it (the earliest snapshot
+    before any exists, so early periods use later fundamentals), the top
+    `positions` are weighted by `method` as in allocate_portfolio, and the
+    book is held until the next rebalance. `cost_bps` is charged on traded value.
+
+    Returns {"dates", "equity", "turnover", "rebalances", "holdings", **metrics}
+    with metrics as in get_portfolio_performance plus "avg_turnover"
+    (one-way, per rebalance after the first), or None without enough data.
+    """
+    if symbols is None:
+        symbols = [row[0] for row in get_connection().execute("SELECT symbol FROM fundamentals ORDER BY symbol")]
+    matrix = load_matrix(symbols, start, end, fields=("close",))
+    dates, closes = matrix["dates"], matrix["close"]
+    if len(dates) < 2:
+        return None
+    prices = forward_fill(closes)
+    traded = ~np.isnan(closes)
+
+    # Scores in force on each rebalance date (point in time where snapshots exist)
+    rebalances = rebalance_days(dates, frequency)
+    snapshots = snapshot_scores(symbols)
+    if not len(snapshots["dates"]):
+        return None
+    snap = np.clip(np.searchsorted(snapshots["dates"], dates[rebalances], side="right") - 1, 0, None)
+    scores, ranks = snapshots["score"][:, snap], snapshots["rank"][:, snap]
+    ranks = np.where(traded[:, rebalances] & ~np.isnan(scores), ranks, np.nan)
+
+    order, eligible = top_k(ranks, positions)
+    if method == "score":
+        weights = score_weights(scores, order, eligible)
+    else:
+        weights = np.zeros((len(symbols), len(rebalances)))
+        max_weight = max_weight or min(1.0, 2.0 / positions)
+        for k, day in enumerate(rebalances):
+            picks = order[eligible[:, k], k]
+            if len(picks):
+                weights[picks, k] = _covariance_weights(closes, picks, scores[picks, k], day, method, max_weight, lookback)
+    equity, turnover = simulate(prices, weights, rebalances, initial_value, cost_bps)
+
+    metrics = performance_metrics(equity)
+    return {
+        "dates": dates,
+        "equity": equity,
+        "turnover": turnover,
+        "rebalances": dates[rebalances],
+        "holdings": {
+            str(dates[day]): {symbols[i]: round(float(weights[i, k]), 4) for i in np.flatnonzero(weights[:, k])}
+            for k, day in enumerate(rebalances)
+        },
+        "avg_turnover": round(float(turnover[1:].mean()) * 100, 2) if len(turnover) > 1 else 0.0,
+        **metrics,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest the stock selection strategy on stored prices.")
+    parser.add_argument("--start", help="First date (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Last date (YYYY-MM-DD)")
+    parser.add_argument("--frequency", default="M", help="Rebalance every D/W/M/Q, or every N bars")
+    parser.add_argument("--positions", type=int, default=5)
+    parser.add_argument("--method", default="score", help="score, risk_parity, min_variance or mean_variance")
+    parser.add_argument("--cost-bps", type=float, default=0.0, help="Trading cost in basis points of traded value")
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    result = run_backtest(args.start, args.end, args.frequency, args.positions, args.method, cost_bps=args.cost_bps)
+    if result is None:
+        print("❌ Not enough data to backtest.")
+    else:
+        print(f"Backtest {result['dates'][0]} .. {result['dates'][-1]}, {len(result['rebalances'])} rebalances "
+              f"in {time.perf_counter() - t0:.2f}s")
+        for key in ("total_return", "annual_volatility", "sharpe_ratio", "start_value", "end_value", "num_days", "avg_turnover"):
+            print(f"  {key}: {result[key]}")
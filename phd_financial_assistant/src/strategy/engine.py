@@ -1,116 +1,169 @@
 # src/strategy/engine.py
 
-import sqlite3
-from typing import List, Dict
-import joblib
-import os
+import heapq
+from itertools import count
+from typing import List, Dict, Tuple
+import numpy as np
 import pandas as pd
+from src.data.sentiment import load_sentiment
+from src.strategy.features import iter_features, load_features, load_price_features
+from src.strategy.models import get_model, model_version
 
-rf_model_path = "model/stock_score_model.pkl"
-xgb_model_path = "model/xgb_stock_score_model.pkl"
-
-rf_model = joblib.load(rf_model_path) if os.path.exists(rf_model_path) else None
-xgb_model = joblib.load(xgb_model_path) if os.path.exists(xgb_model_path) else None
+# Model inputs, in training order
+FEATURE_COLUMNS = ["pe_ratio", "dividend_yield", "market_cap", "sentiment"]
+MAX_PE_RATIO = 40
+MIN_DIVIDEND_YIELD = 0.01
+# Trailing bars behind return_30d / volatility_30d
+PRICE_WINDOW = 30
 
 def load_candidates(symbols: List[str] = None) -> List[Dict]:
-    conn = sqlite3.connect("local_db/market_data.db")
-    cur = conn.cursor()
-    if symbols and len(symbols) > 0:
-        placeholder = ",".join(["?"] * len(symbols))
-        cur.execute(
-            f"SELECT symbol, pe_ratio, dividend_yield, market_cap, sector, industry FROM fundamentals WHERE symbol IN ({placeholder})",
-            symbols
-        )
-    else:
-        cur.execute(
-            "SELECT symbol, pe_ratio, dividend_yield, market_cap, sector, industry FROM fundamentals"
-        )
-    rows = cur.fetchall()
-    conn.close()
-    stocks = []
-    for row in rows:
-        stocks.append({
-            "symbol": row[0],
-            "pe_ratio": row[1],
-            "dividend_yield": row[2],
-            "market_cap": row[3],
-            "sector": row[4],
-            "industry": row[5],
-        })
-    return stocks
+    """
+    Candidates with their fundamentals, sentiment and 30d price stats, read
+    from the latest features_daily snapshot (the same features the models
+    were trained on).
+    """
+    return load_features(symbols)
 
 def enrich_sentiment(stocks: List[Dict]) -> List[Dict]:
-    # Attach avg_sentiment from news table (if available)
-    conn = sqlite3.connect("local_db/market_data.db")
-    cur = conn.cursor()
-    for stock in stocks:
-        cur.execute("SELECT AVG(sentiment) FROM news WHERE symbol=?", (stock["symbol"],))
-        result = cur.fetchone()
-        stock["avg_sentiment"] = result[0] if result and result[0] is not None else 0
-    conn.close()
+    # Attach avg_sentiment (all headlines) and sentiment_decayed (recency-weighted)
+    # from the sentiment_daily aggregates, in one query, where not already present
+    missing = [stock for stock in stocks if "avg_sentiment" not in stock]
+    if not missing:
+        return stocks
+    sentiment = load_sentiment([stock["symbol"] for stock in missing])
+    for stock in missing:
+        s = sentiment.get(stock["symbol"], {})
+        stock["avg_sentiment"] = s.get("avg") if s.get("avg") is not None else 0
+        stock["sentiment_decayed"] = s.get("decayed") if s.get("decayed") is not None else 0
+    return stocks
+
+def _column(stocks: List[Dict], key: str) -> np.ndarray:
+    """One field across all stocks as a float array; None becomes NaN."""
+    return np.array([stock.get(key) for stock in stocks], dtype=float)
+
+def score_candidates(candidates: List[Dict], max_pe: float = MAX_PE_RATIO,
+                     min_dividend_yield: float = MIN_DIVIDEND_YIELD) -> List[Dict]:
+    """
+    Apply the P/E and dividend filters to the whole universe at once, build one
+    feature matrix and score it with a single predict call per model.
+    Returns the surviving stocks (in input order) with rf_score, xgb_score,
+    score and model_version (the artifact behind `score`) attached.
+    """
+    if not candidates:
+        return []
+    pe = _column(candidates, "pe_ratio")
+    div = _column(candidates, "dividend_yield")
+    # Basic filters: P/E present, non-zero and at most 40; dividend yield missing or >= 1%
+    keep = ~np.isnan(pe) & (pe != 0) & (pe <= max_pe) & ~(div < min_dividend_yield)
+    stocks = [stock for stock, k in zip(candidates, keep) if k]
+    if not stocks:
+        return []
+
+    pe, div = pe[keep], np.nan_to_num(div[keep])
+    sentiment = np.nan_to_num(_column(stocks, "avg_sentiment"))
+    features = pd.DataFrame({
+        "pe_ratio": pe,
+        "dividend_yield": div,
+        "market_cap": _column(stocks, "market_cap"),
+        "sentiment": sentiment,
+    }, columns=FEATURE_COLUMNS)
+
+    rf_model, xgb_model = get_model("rf"), get_model("xgb")
+    rf_scores = rf_model.predict(features) if rf_model else None
+    xgb_scores = xgb_model.predict(features) if xgb_model else None
+    # Main score for allocation & ranking: XGBoost, else random forest, else a simple formula
+    if xgb_scores is not None:
+        scores, version = xgb_scores, model_version("xgb")
+    elif rf_scores is not None:
+        scores, version = rf_scores, model_version("rf")
+    else:
+        scores, version = 0.05 * (1 / pe) + 0.1 * div + sentiment, "formula"
+
+    for i, stock in enumerate(stocks):
+        stock["rf_score"] = float(rf_scores[i]) if rf_scores is not None else None
+        stock["xgb_score"] = float(xgb_scores[i]) if xgb_scores is not None else None
+        stock["score"] = round(float(scores[i]), 4)
+        stock["model_version"] = version
     return stocks
 
+def _attach_price_features(stocks: List[Dict]):
+    # Add historical return/volatility from the bulk price_features table,
+    # for candidates that did not come from a feature snapshot
+    missing = [stock for stock in stocks if "return_30d" not in stock]
+    if not missing:
+        return
+    features = load_price_features([stock["symbol"] for stock in missing], window=PRICE_WINDOW)
+    for stock in missing:
+        f = features.get(stock["symbol"], {})
+        ret, vol = f.get("return_pct"), f.get("volatility_pct")
+        stock["return_30d"] = round(ret, 2) if ret is not None else None
+        stock["volatility_30d"] = round(vol, 2) if vol is not None else None
+
 def filter_and_score(candidates: List[Dict]) -> List[Dict]:
-    filtered = []
-    for stock in candidates:
-        # Basic filters
-        if not stock["pe_ratio"] or stock["pe_ratio"] > 40:
-            continue
-        if stock["dividend_yield"] is not None and stock["dividend_yield"] < 0.01:
-            continue
-
-        # Get features for the model
-        pe = stock["pe_ratio"]
-        div = stock["dividend_yield"] or 0
-        mcap = stock.get("market_cap", 0)
-        sentiment = stock.get("avg_sentiment", 0) or 0
-
-        columns = ["pe_ratio", "dividend_yield", "market_cap", "sentiment"]
-        features_df = pd.DataFrame([[pe, div, mcap, sentiment]], columns=columns)
-        
-        # Predict with both models with DataFrame if available
-        rf_score = float(rf_model.predict(features_df)[0]) if rf_model else None
-        xgb_score = float(xgb_model.predict(features_df)[0]) if xgb_model else None
-
-        # Add scores to stock
-        stock["rf_score"] = rf_score
-        stock["xgb_score"] = xgb_score
-
-        # Add historical return/volatility if available
-        try:
-            from src.trading.alpaca_client import get_price_history
-            series = get_price_history(stock["symbol"], days=30)
-            if series is not None and hasattr(series, "__len__") and len(series) >= 2:
-                pct_return = (series.iloc[-1] - series.iloc[0]) / series.iloc[0]
-                volatility = series.pct_change().std()
-                stock["return_30d"] = round(float(pct_return) * 100, 2)
-                stock["volatility_30d"] = round(float(volatility) * 100, 2)
-            else:
-                stock["return_30d"] = None
-                stock["volatility_30d"] = None
-        except Exception:
-            stock["return_30d"] = None
-            stock["volatility_30d"] = None
-
-        # Main score for allocation & ranking
-        if xgb_score is not None:
-            score = xgb_score
-        elif rf_score is not None:
-            score = rf_score
-        else:
-            score = 0.05 * (1 / pe) + 0.1 * div + sentiment
-
-        stock["score"] = round(score, 4)
-        filtered.append(stock)
+    filtered = score_candidates(candidates)
+    _attach_price_features(filtered)
 
     # Sort by XGBoost score (or fallback)
-    filtered = sorted(filtered, key=lambda x: x["xgb_score"] if x["xgb_score"] is not None else -float("inf"), reverse=True)
+    filtered = sorted(filtered, key=_rank_key, reverse=True)
     return filtered
 
-def allocate_portfolio(ranked: List[Dict], budget: float = 1000.0) -> List[Dict]:
-    total_score = sum(stock["score"] for stock in ranked[:5]) or 1.0
+def _rank_key(stock: Dict) -> float:
+    return stock["xgb_score"] if stock["xgb_score"] is not None else -float("inf")
+
+def _push_top(heap: list, k: int, entry: tuple):
+    if len(heap) < k:
+        heapq.heappush(heap, entry)
+    elif entry > heap[0]:
+        heapq.heapreplace(heap, entry)
+
+def _sorted_top(heap: list) -> List[Dict]:
+    return [entry[-1] for entry in sorted(heap, reverse=True)]
+
+def stream_top_k(k: int = 5, sector_k: int = 0, chunk_size: int = 5000) -> Tuple[List[Dict], Dict[str, List[Dict]]]:
+    """
+    Rank the whole feature snapshot without holding it in memory: candidates
+    are read `chunk_size` at a time, each chunk is filtered and scored as a
+    batch, and only the best `k` (and, with `sector_k`, the best `sector_k`
+    per sector) are kept in bounded heaps.
+
+    Returns (top k, {sector: top sector_k}), ordered as filter_and_score
+    would order them.
+    """
+    top, by_sector = [], {}
+    # Sequence numbers break score ties in favour of earlier rows, like a stable sort
+    seq = count()
+    for chunk in iter_features(chunk_size):
+        for stock in score_candidates(chunk):
+            entry = (_rank_key(stock), -next(seq), stock)
+            _push_top(top, k, entry)
+            if sector_k:
+                _push_top(by_sector.setdefault(stock.get("sector"), []), sector_k, entry)
+    return _sorted_top(top), {sector: _sorted_top(heap) for sector, heap in by_sector.items()}
+
+def allocate_portfolio(ranked: List[Dict], budget: float = 1000.0, method: str = "score",
+                       positions: int = 5, max_weight: float = None) -> List[Dict]:
+    """
+    Split `budget` over the top `positions` picks. "score" splits it in
+    proportion to score; "risk_parity", "min_variance" and "mean_variance"
+    use a shrinkage covariance of daily returns (see allocation.py), with no
+    position above `max_weight`. Falls back to "score" if no pick has enough
+    price history.
+    """
+    if method != "score":
+        from src.strategy.allocation import allocate_weights
+        weights = allocate_weights(ranked, method, positions, max_weight)
+        if weights:
+            by_symbol = {stock["symbol"]: stock for stock in ranked}
+            portfolio = []
+            for symbol, weight in sorted(weights.items(), key=lambda item: -item[1]):
+                entry = by_symbol[symbol].copy()
+                entry["allocation"] = round(weight * budget, 2)
+                portfolio.append(entry)
+            return portfolio
+        print(f"⚠️ No {method} weights (not enough price history), splitting by score")
+    total_score = sum(stock["score"] for stock in ranked[:positions]) or 1.0
     portfolio = []
-    for stock in ranked[:5]:
+    for stock in ranked[:positions]:
         allocation = round((stock["score"] / total_score) * budget, 2)
         entry = stock.copy()
         entry["allocation"] = allocation
@@ -0,0 +1,158 @@
+# src/strategy/equity.py
+
+# Persisted daily equity curves (simulated portfolio, Alpaca account) with
+# running statistics: new days are appended and folded into the mean/variance
+# of daily returns (Welford, merged per batch), the high-water mark and the
+# maximum drawdown, so analytics are one row read however long the history.
+from datetime import datetime
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from src.data.db import get_connection, transaction
+
+TRADING_DAYS = 252
+STATS_COLUMNS = (
+    "account", "source_version", "first_day", "last_day", "start_value", "last_value", "n_days",
+    "n_returns", "mean_return", "m2_return", "high_water", "max_drawdown", "updated_at",
+)
+
+def init_equity_tables():
+    with transaction() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS equity_curve (
+                account TEXT NOT NULL,
+                day TEXT NOT NULL,
+                value REAL NOT NULL,
+                daily_return REAL,
+                PRIMARY KEY (account, day)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS equity_stats (
+                account TEXT PRIMARY KEY,
+                source_version TEXT,
+                first_day TEXT,
+                last_day TEXT,
+                start_value REAL,
+                last_value REAL,
+                n_days INTEGER NOT NULL DEFAULT 0,
+                n_returns INTEGER NOT NULL DEFAULT 0,
+                mean_return REAL NOT NULL DEFAULT 0,
+                m2_return REAL NOT NULL DEFAULT 0,
+                high_water REAL,
+                max_drawdown REAL NOT NULL DEFAULT 0,
+                updated_at TEXT
+            )
+        """)
+
+def get_equity_stats(account: str) -> Optional[Dict]:
+    init_equity_tables()
+    row = get_connection().execute(
+        f"SELECT {', '.join(STATS_COLUMNS)} FROM equity_stats WHERE account = ?", (account,)
+    ).fetchone()
+    return dict(zip(STATS_COLUMNS, row)) if row else None
+
+def reset_equity(account: str):
+    init_equity_tables()
+    with transaction() as conn:
+        conn.execute("DELETE FROM equity_curve WHERE account = ?", (account,))
+        conn.execute("DELETE FROM equity_stats WHERE account = ?", (account,))
+
+def append_equity(account: str, days: Sequence[str], values: Sequence[float], source_version: str = None) -> int:
+    """
+    Append the (day, value) points newer than the account's last stored day
+    and fold them into its running statistics. Days already stored are kept
+    as they are. Returns the number of days appended.
+    """
+    stats = get_equity_stats(account) or {
+        "account": account, "source_version": None, "first_day": None, "last_day": None,
+        "start_value": None, "last_value": None, "n_days": 0, "n_returns": 0, "mean_return": 0.0,
+        "m2_return": 0.0, "high_water": None, "max_drawdown": 0.0,
+    }
+    points = sorted((str(d)[:10], float(v)) for d, v in zip(days, values) if v is not None and not np.isnan(v))
+    new = [(d, v) for d, v in points if stats["last_day"] is None or d > stats["last_day"]]
+    if not new:
+        if source_version is not None and source_version != stats["source_version"] and stats["last_day"]:
+            with transaction() as conn:
+                conn.execute("UPDATE equity_stats SET source_version = ? WHERE account = ?", (source_version, account))
+        return 0
+    new_days = [d for d, _ in new]
+    new_values = np.array([v for _, v in new])
+
+    # Daily returns of the new points, chained from the last stored value (no return off a zero value)
+    previous = np.r_[stats["last_value"] if stats["last_value"] is not None else np.nan, new_values[:-1]]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.where(previous > 0, new_values / previous - 1, np.nan)
+    batch = returns[~np.isnan(returns)]
+
+    # Welford/Chan merge of the batch's count, mean and sum of squared deviations
+    n_a, mean_a, m2_a = stats["n_returns"], stats["mean_return"], stats["m2_return"]
+    n_b = len(batch)
+    if n_b:
+        mean_b = batch.mean()
+        m2_b = np.sum((batch - mean_b) ** 2)
+        n = n_a + n_b
+        delta = mean_b - mean_a
+        stats["mean_return"] = mean_a + delta * n_b / n
+        stats["m2_return"] = m2_a + m2_b + delta ** 2 * n_a * n_b / n
+        stats["n_returns"] = n
+
+    # High-water mark and drawdown carried across batches
+    start_hw = stats["high_water"] if stats["high_water"] is not None else -np.inf
+    high_water = np.maximum.accumulate(np.maximum(new_values, start_hw))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdowns = np.where(high_water > 0, 1 - new_values / high_water, 0.0)
+    stats["max_drawdown"] = max(stats["max_drawdown"], float(drawdowns.max()))
+    stats["high_water"] = float(high_water[-1])
+
+    if stats["first_day"] is None:
+        stats["first_day"], stats["start_value"] = new_days[0], float(new_values[0])
+    stats["last_day"], stats["last_value"] = new_days[-1], float(new_values[-1])
+    stats["n_days"] += len(new)
+    stats["source_version"] = source_version if source_version is not None else stats["source_version"]
+    stats["updated_at"] = datetime.now().isoformat(timespec="seconds")
+
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO equity_curve (account, day, value, daily_return) VALUES (?, ?, ?, ?)",
+            [(account, d, float(v), None if np.isnan(r) else float(r)) for d, v, r in zip(new_days, new_values, returns)],
+        )
+        conn.execute(
+            f"INSERT OR REPLACE INTO equity_stats ({', '.join(STATS_COLUMNS)}) VALUES ({', '.join(['?'] * len(STATS_COLUMNS))})",
+            tuple(float(stats[c]) if isinstance(stats[c], np.floating) else stats[c] for c in STATS_COLUMNS),
+        )
+    return len(new)
+
+def equity_metrics(account: str, ddof: int = 0) -> Optional[Dict]:
+    """
+    Return, volatility, Sharpe ratio, high-water mark and max drawdown of the
+    stored curve, from its running statistics. `ddof` picks population (0) or
+    sample (1) standard deviation of daily returns. None with fewer than 2 days.
+    """
+    stats = get_equity_stats(account)
+    if not stats or stats["n_returns"] < 1 or stats["n_returns"] - ddof < 1:
+        return None
+    volatility = np.sqrt(stats["m2_return"] / (stats["n_returns"] - ddof))
+    sharpe = stats["mean_return"] / volatility * np.sqrt(TRADING_DAYS) if volatility > 0 else None
+    return {
+        "total_return": round((stats["last_value"] / stats["start_value"] - 1) * 100, 2) if stats["start_value"] else None,
+        "annual_volatility": round(volatility * np.sqrt(TRADING_DAYS) * 100, 2),
+        "sharpe_ratio": round(sharpe, 2) if sharpe is not None else None,
+        "start_value": round(stats["start_value"], 2),
+        "end_value": round(stats["last_value"], 2),
+        "num_days": stats["n_days"],
+        "high_water_mark": round(stats["high_water"], 2),
+        "max_drawdown": round(stats["max_drawdown"] * 100, 2),
+        "first_day": stats["first_day"],
+        "last_day": stats["last_day"],
+    }
+
+def load_equity_curve(account: str):
+    """The stored curve as a pandas Series indexed by date."""
+    import pandas as pd
+    init_equity_tables()
+    df = pd.read_sql_query(
+        "SELECT day, value FROM equity_curve WHERE account = ? ORDER BY day", get_connection(), params=(account,)
+    )
+    return pd.Series(df["value"].to_numpy(), index=pd.to_datetime(df["day"]), name=account)
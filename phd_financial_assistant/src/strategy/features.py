@@ -0,0 +1,290 @@
+# src/strategy/features.py
+
+# Set-based model/ranking features for the whole universe, computed in one pass,
+# and the daily feature snapshots shared by training and serving
+import argparse
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+from src.data.columnar import load_matrix
+from src.data.db import get_connection, transaction, bulk_insert
+from src.data.sentiment import init_sentiment_daily, load_sentiment
+
+# Trailing windows (in bars) kept in price_features; 30 is what the engine shows
+DEFAULT_WINDOWS = (30,)
+PRICE_FEATURE_COLUMNS = ("symbol", "window_bars", "as_of", "bars", "return_pct", "volatility_pct")
+
+# Bump whenever a feature's definition changes; snapshots of older versions are kept
+FEATURE_SET_VERSION = 1
+FEATURES_DAILY_COLUMNS = (
+    "version", "as_of", "symbol", "pe_ratio", "dividend_yield", "market_cap", "sector", "industry",
+    "avg_sentiment", "sentiment_decayed", "return_30d", "volatility_30d", "built_at",
+)
+# Columns handed to the engine and trainer (everything but the snapshot keys)
+FEATURE_FIELDS = FEATURES_DAILY_COLUMNS[2:-1]
+# What a snapshot is built from; each query reads an index or a small table
+SOURCE_VERSION_QUERIES = (
+    "SELECT COUNT(*), MAX(last_epoch), MAX(updated_at) FROM ohlcv_watermarks",
+    "SELECT MAX(id) FROM news",
+    "SELECT total(n), total(total) FROM sentiment_daily",
+    "SELECT COUNT(*), MAX(fetched_at) FROM fundamentals",
+)
+
+def init_price_features_table():
+    with transaction() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS price_features (
+                symbol TEXT NOT NULL,
+                window_bars INTEGER NOT NULL,
+                as_of TEXT,
+                bars INTEGER NOT NULL,
+                return_pct REAL,
+                volatility_pct REAL,
+                PRIMARY KEY (window_bars, symbol)
+            )
+        """)
+
+def trailing_price_features(closes: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Trailing return and volatility over each row's last `window` bars.
+
+    `closes` is a (symbols x dates) matrix with NaN where a symbol has no bar.
+    Bars are counted per symbol, as get_price_history does, so a symbol that
+    missed some days still looks back `window` of its own bars.
+    Returns (bars used, return %, volatility % of daily returns); return needs
+    two bars and volatility three, otherwise NaN.
+    """
+    n = closes.shape[0]
+    valid = ~np.isnan(closes)
+    # Stable sort on the valid flag moves each row's bars to the right, in date order
+    order = np.argsort(valid, axis=1, kind="stable")
+    packed = np.take_along_axis(closes, order, axis=1)[:, -window:]
+    width = packed.shape[1]
+    bars = np.minimum(valid.sum(axis=1), width)
+
+    returns = np.full(n, np.nan)
+    volatility = np.full(n, np.nan)
+    if width == 0:
+        return bars, returns, volatility
+    rows = np.flatnonzero(bars >= 2)
+    first = packed[rows, width - bars[rows]]
+    returns[rows] = (packed[rows, -1] - first) / first * 100
+
+    daily = packed[:, 1:] / packed[:, :-1] - 1
+    rows = np.flatnonzero(bars >= 3)
+    if len(rows):
+        volatility[rows] = np.nanstd(daily[rows], axis=1, ddof=1) * 100
+    return bars, returns, volatility
+
+def _universe() -> List[str]:
+    return [row[0] for row in get_connection().execute("SELECT symbol FROM fundamentals ORDER BY symbol")]
+
+def _nullable(value: float):
+    return None if np.isnan(value) else float(value)
+
+def compute_price_features(windows: Sequence[int] = DEFAULT_WINDOWS, symbols: List[str] = None) -> int:
+    """
+    Recompute price_features for `symbols` (default: the whole universe) from
+    one aligned close matrix. Symbols without bars get a row with bars=0, so
+    readers can tell "no data" from "not computed". Returns rows written.
+    """
+    init_price_features_table()
+    symbols = symbols if symbols is not None else _universe()
+    if not symbols:
+        return 0
+    matrix = load_matrix(symbols, fields=("close",))
+    as_of = str(matrix["dates"][-1]) if len(matrix["dates"]) else None
+    rows = []
+    for window in windows:
+        bars, returns, volatility = trailing_price_features(matrix["close"], window)
+        rows.extend(
+            (symbol, window, as_of, int(bars[i]), _nullable(returns[i]), _nullable(volatility[i]))
+            for i, symbol in enumerate(symbols)
+        )
+    return bulk_insert("price_features", PRICE_FEATURE_COLUMNS, rows, conflict="REPLACE")
+
+def _latest_bar_date() -> str:
+    try:
+        row = get_connection().execute("SELECT date(MAX(last_epoch), 'unixepoch') FROM ohlcv_watermarks").fetchone()
+    except Exception:
+        return None
+    return row[0] if row else None
+
+def load_price_features(symbols: List[str], window: int = DEFAULT_WINDOWS[0]) -> Dict[str, Dict]:
+    """
+    {symbol: {"bars", "return_pct", "volatility_pct"}} for `symbols`, read from
+    price_features. The table is recomputed first if it has no rows for some of
+    the symbols or is older than the newest stored bar.
+    """
+    if not symbols:
+        return {}
+    init_price_features_table()
+    conn = get_connection()
+    placeholder = ",".join(["?"] * len(symbols))
+    query = f"""
+        SELECT symbol, as_of, bars, return_pct, volatility_pct FROM price_features
+        WHERE window_bars = ? AND symbol IN ({placeholder})
+    """
+    rows = conn.execute(query, (window, *symbols)).fetchall()
+    latest = _latest_bar_date()
+    stale = len(rows) < len(set(symbols)) or any(latest and (as_of or "") < latest for _, as_of, *_ in rows)
+    if stale:
+        windows = sorted({window, *DEFAULT_WINDOWS})
+        compute_price_features(windows, sorted(set(_universe()) | set(symbols)))
+        rows = conn.execute(query, (window, *symbols)).fetchall()
+    return {
+        symbol: {"bars": bars, "return_pct": return_pct, "volatility_pct": volatility_pct}
+        for symbol, _, bars, return_pct, volatility_pct in rows
+    }
+
+def init_features_daily_table():
+    with transaction() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS features_daily (
+                version INTEGER NOT NULL,
+                as_of TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                pe_ratio REAL,
+                dividend_yield REAL,
+                market_cap REAL,
+                sector TEXT,
+                industry TEXT,
+                avg_sentiment REAL,
+                sentiment_decayed REAL,
+                return_30d REAL,
+                volatility_30d REAL,
+                built_at TEXT,
+                PRIMARY KEY (version, as_of, symbol)
+            ) WITHOUT ROWID
+        """)
+        # The source_version each snapshot was built from, to rebuild it when the inputs move
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS features_daily_builds (
+                version INTEGER NOT NULL,
+                as_of TEXT NOT NULL,
+                source_version TEXT,
+                built_at TEXT,
+                PRIMARY KEY (version, as_of)
+            ) WITHOUT ROWID
+        """)
+
+def source_version() -> str:
+    """Fingerprint of the stored inputs of a snapshot: ingestion watermarks, news, sentiment, fundamentals."""
+    conn = get_connection()
+    parts = []
+    for sql in SOURCE_VERSION_QUERIES:
+        try:
+            parts.extend(conn.execute(sql).fetchone())
+        except Exception:
+            parts.append(None)
+    return "\x1f".join(str(p) for p in parts)
+
+def build_features_daily(as_of: str = None, version: int = FEATURE_SET_VERSION) -> int:
+    """
+    Materialize the feature snapshot for `as_of` (default today): fundamentals,
+    sentiment aggregates and 30-bar price stats for every symbol, each read
+    with a single query. Replaces any snapshot already built for that day.
+    Returns the number of rows written.
+    """
+    init_features_daily_table()
+    as_of = as_of or datetime.now().strftime("%Y-%m-%d")
+    # Taken before reading, so data landing mid-build triggers another build (sentiment_daily
+    # is created first, since load_sentiment would otherwise change the version itself)
+    init_sentiment_daily()
+    source = source_version()
+    fundamentals = get_connection().execute(
+        "SELECT symbol, pe_ratio, dividend_yield, market_cap, sector, industry FROM fundamentals ORDER BY symbol"
+    ).fetchall()
+    symbols = [row[0] for row in fundamentals]
+    sentiment = load_sentiment(symbols)
+    prices = load_price_features(symbols, window=30)
+    built_at = datetime.now().isoformat(timespec="seconds")
+
+    rows = []
+    for symbol, pe_ratio, dividend_yield, market_cap, sector, industry in fundamentals:
+        s, p = sentiment.get(symbol, {}), prices.get(symbol, {})
+        ret, vol = p.get("return_pct"), p.get("volatility_pct")
+        rows.append((
+            version, as_of, symbol, pe_ratio, dividend_yield, market_cap, sector, industry,
+            s.get("avg") if s.get("avg") is not None else 0,
+            s.get("decayed") if s.get("decayed") is not None else 0,
+            round(ret, 2) if ret is not None else None,
+            round(vol, 2) if vol is not None else None,
+            built_at,
+        ))
+    with transaction() as conn:
+        conn.execute("DELETE FROM features_daily WHERE version=? AND as_of=?", (version, as_of))
+        conn.execute(
+            "INSERT OR REPLACE INTO features_daily_builds (version, as_of, source_version, built_at) VALUES (?, ?, ?, ?)",
+            (version, as_of, source, built_at),
+        )
+        return bulk_insert("features_daily", FEATURES_DAILY_COLUMNS, rows, conn=conn)
+
+def _snapshot_date(version: int, build: bool) -> str:
+    """
+    as_of of the snapshot to read: today's, else the newest. With `build`,
+    today's is built first if it is missing or its inputs have changed since.
+    """
+    init_features_daily_table()
+    today = datetime.now().strftime("%Y-%m-%d")
+    conn = get_connection()
+    latest = conn.execute("SELECT MAX(as_of) FROM features_daily WHERE version=?", (version,)).fetchone()[0]
+    if build:
+        built = conn.execute(
+            "SELECT source_version FROM features_daily_builds WHERE version=? AND as_of=?", (version, today)
+        ).fetchone()
+        if latest != today or built is None or built[0] != source_version():
+            build_features_daily(today, version)
+            latest = today
+    return latest
+
+def load_features(symbols: List[str] = None, version: int = FEATURE_SET_VERSION, build: bool = True) -> List[Dict]:
+    """
+    The latest feature snapshot as a list of dicts (keys: FEATURE_FIELDS),
+    optionally limited to `symbols`. If there is no snapshot for today yet, or
+    its inputs have changed since it was built, it is built first (unless
+    `build` is off, in which case the newest one is used).
+    """
+    as_of = _snapshot_date(version, build)
+    if as_of is None:
+        return []
+    query = f"SELECT {', '.join(FEATURE_FIELDS)} FROM features_daily WHERE version=? AND as_of=? {{where}} ORDER BY symbol"
+    conn = get_connection()
+    if symbols:
+        placeholder = ",".join(["?"] * len(symbols))
+        rows = conn.execute(query.format(where=f"AND symbol IN ({placeholder})"), (version, as_of, *symbols))
+    else:
+        rows = conn.execute(query.format(where=""), (version, as_of))
+    return [dict(zip(FEATURE_FIELDS, row)) for row in rows]
+
+def iter_features(chunk_size: int = 5000, version: int = FEATURE_SET_VERSION, build: bool = True) -> Iterator[List[Dict]]:
+    """
+    The latest feature snapshot in chunks of at most `chunk_size` dicts, read
+    from one cursor, so callers never hold more than a chunk in memory.
+    """
+    as_of = _snapshot_date(version, build)
+    if as_of is None:
+        return
+    cursor = get_connection().execute(
+        f"SELECT {', '.join(FEATURE_FIELDS)} FROM features_daily WHERE version=? AND as_of=? ORDER BY symbol",
+        (version, as_of),
+    )
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield [dict(zip(FEATURE_FIELDS, row)) for row in rows]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute price features and today's feature snapshot.")
+    parser.add_argument("--windows", type=int, nargs="+", default=list(DEFAULT_WINDOWS), help="Trailing windows in bars")
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    n = compute_price_features(args.windows)
+    print(f"Wrote {n} price feature rows in {time.perf_counter() - t0:.2f}s")
+    t0 = time.perf_counter()
+    n = build_features_daily()
+    print(f"Built feature snapshot v{FEATURE_SET_VERSION} for {n} symbols in {time.perf_counter() - t0:.2f}s")
@@ -0,0 +1,121 @@
+# src/strategy/models.py
+
+# Lazy, per-process model registry: artifacts are loaded on first use and
+# reloaded only when the file on disk changes.
+import argparse
+import hashlib
+import os
+import threading
+from typing import Dict, Optional
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+MODEL_DIR = os.getenv("MODEL_DIR", os.path.join(PROJECT_ROOT, "model"))
+
+# Registry name -> artifact base name (without extension)
+MODELS = {
+    "rf": "stock_score_model",
+    "xgb": "xgb_stock_score_model",
+}
+# XGBoost's own format loads without unpickling (or importing sklearn)
+NATIVE_XGB_EXT = ".ubj"
+# Pickles at least this large are memory-mapped: their arrays stay in the page
+# cache and are shared between processes instead of being copied into each one
+MMAP_MIN_BYTES = int(os.getenv("MODEL_MMAP_MIN_BYTES", 16 * 1024 * 1024))
+
+# name -> {"path", "mtime_ns", "size", "sha1", "model"}
+_loaded: Dict[str, Dict] = {}
+# (path, mtime_ns, size) -> sha1, so versions can be reported without loading
+_hashes: Dict[tuple, str] = {}
+_lock = threading.Lock()
+
+def artifact_path(name: str, model_dir: str = MODEL_DIR) -> Optional[str]:
+    """
+    The file a model is loaded from: the native XGBoost file if present and at
+    least as new as the pickle, else the pickle.
+    """
+    base = os.path.join(model_dir, MODELS[name])
+    native, pickle_path = base + NATIVE_XGB_EXT, base + ".pkl"
+    has_pickle = os.path.exists(pickle_path)
+    if name == "xgb" and os.path.exists(native):
+        if not has_pickle or os.path.getmtime(native) >= os.path.getmtime(pickle_path):
+            return native
+    return pickle_path if has_pickle else None
+
+def _sha1(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _file_sha1(path: str, st: os.stat_result) -> str:
+    stamp = (path, st.st_mtime_ns, st.st_size)
+    if stamp not in _hashes:
+        _hashes[stamp] = _sha1(path)
+    return _hashes[stamp]
+
+def _load(path: str):
+    if path.endswith(NATIVE_XGB_EXT):
+        from xgboost import XGBRegressor
+        model = XGBRegressor()
+        model.load_model(path)
+        return model
+    import joblib
+    mmap_mode = "r" if os.path.getsize(path) >= MMAP_MIN_BYTES else None
+    return joblib.load(path, mmap_mode=mmap_mode)
+
+def _entry(name: str, model_dir: str = MODEL_DIR) -> Optional[Dict]:
+    path = artifact_path(name, model_dir)
+    with _lock:
+        if path is None:
+            _loaded.pop(name, None)
+            return None
+        st = os.stat(path)
+        entry = _loaded.get(name)
+        if entry and entry["path"] == path and (entry["mtime_ns"], entry["size"]) == (st.st_mtime_ns, st.st_size):
+            return entry
+        sha1 = _file_sha1(path, st)
+        if entry and entry["path"] == path and entry["sha1"] == sha1:
+            # Touched but not rewritten: keep the loaded model
+            entry.update(mtime_ns=st.st_mtime_ns, size=st.st_size)
+            return entry
+        entry = _loaded[name] = {
+            "path": path, "mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha1": sha1, "model": _load(path),
+        }
+        return entry
+
+def get_model(name: str, model_dir: str = MODEL_DIR):
+    """The model registered as `name` ("rf" or "xgb"), or None if it has not been trained."""
+    entry = _entry(name, model_dir)
+    return entry["model"] if entry else None
+
+def model_version(name: str, model_dir: str = MODEL_DIR) -> Optional[str]:
+    """
+    Short content hash of the artifact `get_model(name)` returns, e.g.
+    "xgb:3f2a9c01b7de". Hashes the file without loading the model.
+    """
+    path = artifact_path(name, model_dir)
+    if path is None:
+        return None
+    with _lock:
+        sha1 = _file_sha1(path, os.stat(path))
+    return f"{name}:{sha1[:12]}"
+
+def export_native_xgb(model_dir: str = MODEL_DIR) -> Optional[str]:
+    """Write the pickled XGBoost model in XGBoost's native format. Returns the new path."""
+    import joblib
+    pickle_path = os.path.join(model_dir, MODELS["xgb"] + ".pkl")
+    if not os.path.exists(pickle_path):
+        return None
+    native_path = os.path.join(model_dir, MODELS["xgb"] + NATIVE_XGB_EXT)
+    joblib.load(pickle_path).save_model(native_path)
+    return native_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or convert the scoring models.")
+    parser.add_argument("--export-native", action="store_true", help="Save the XGBoost pickle in native format")
+    args = parser.parse_args()
+    if args.export_native:
+        print(f"Wrote {export_native_xgb()}")
+    for name in MODELS:
+        print(f"{name}: {artifact_path(name) or 'not trained'} ({model_version(name) or '-'})")
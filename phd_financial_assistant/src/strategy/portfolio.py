@@ -1,231 +1,252 @@
 # Track portfolio, compute performance metrics
-import sqlite3
 import pandas as pd
 import numpy as np
+from collections import OrderedDict
 from datetime import datetime
 from src.trading.alpaca_client import get_alpaca_portfolio, get_recent_alpaca_orders
-from src.trading.alpaca_client import get_price_history
-
-def build_alpaca_portfolio_history():
-    """Reconstruct daily portfolio value for the Alpaca paper account."""
-    positions = get_alpaca_portfolio()
+from src.data.columnar import load_matrix
+from src.data.db import get_connection, transaction
+from src.data.migrate import DEFAULT_TIMEFRAME
+from src.data.storage import get_latest_prices
+from src.strategy.equity import append_equity, equity_metrics, get_equity_stats, reset_equity
+
+# Accounts in the equity_curve / equity_stats tables
+SIMULATED_ACCOUNT = "simulated"
+ALPACA_ACCOUNT = "alpaca"
+
+# (positions, days, data version) -> history DataFrame, most recent last
+_history_cache = OrderedDict()
+HISTORY_CACHE_ENTRIES = 8
+
+def _price_data_version(symbols):
+    placeholder = ",".join(["?"] * len(symbols))
+    return get_connection().execute(
+        f"SELECT COUNT(*), MAX(last_epoch), MAX(updated_at) FROM ohlcv_watermarks WHERE symbol IN ({placeholder})",
+        symbols,
+    ).fetchone()
+
+def _positions_version(qty_by_symbol):
+    return "|".join(f"{s}:{qty_by_symbol[s]:g}" for s in sorted(qty_by_symbol))
+
+def build_alpaca_portfolio_history(positions=None, days=30):
+    """
+    Reconstruct daily portfolio value for the Alpaca paper account from each
+    position's last `days` bars. Memoized on the positions, `days` and the
+    stored price data, so analytics and charts share one build per render.
+    """
+    if positions is None:
+        positions = get_alpaca_portfolio()
     if not positions or not isinstance(positions, list):
         return None
 
-    symbols = [pos['symbol'] for pos in positions]
-    # Get historical prices for each symbol (30 days)
-    price_histories = {}
-    for sym in symbols:
-        s = get_price_history(sym, days=30)
-        if isinstance(s, pd.Series):
-            price_histories[sym] = s
-
-    # Build value over time (for days present in any symbol)
-    all_dates = pd.to_datetime(sorted(
-        {date for series in price_histories.values() for date in series.index}
-    ))
-    history = pd.DataFrame(index=all_dates)
-
-    # Sum market value for each symbol at each date
-    for sym in symbols:
-        qty = 0
-        # Find quantity for this symbol (from positions)
-        for pos in positions:
-            if pos['symbol'] == sym:
-                try:
-                    qty = float(pos['qty'])
-                except Exception:
-                    qty = 0
-        if sym in price_histories:
-            s = price_histories[sym]
-            # Align series to the DataFrame index (do not fill yet)
-            s = s.reindex(history.index)
-            history[sym] = s * qty
-
-    # Fill forward missing prices for all symbols at once
-    history = history.fillna(method='ffill')
+    qty_by_symbol = {}
+    for pos in positions:
+        try:
+            qty_by_symbol[pos['symbol']] = float(pos['qty'])
+        except Exception:
+            qty_by_symbol[pos['symbol']] = 0.0
+    symbols = sorted(qty_by_symbol)
+    key = (tuple((s, qty_by_symbol[s]) for s in symbols), days, _price_data_version(symbols))
+    if key in _history_cache:
+        _history_cache.move_to_end(key)
+        return _history_cache[key].copy()
+
+    # All position closes in one aligned (symbols x dates) read
+    matrix = load_matrix(symbols, fields=("close",))
+    closes = matrix["close"]
+    valid = ~np.isnan(closes)
+    # Keep each symbol's own last `days` bars; symbols with fewer than 2 bars are left out
+    bars_from_end = np.cumsum(valid[:, ::-1], axis=1)[:, ::-1]
+    closes = np.where(valid & (bars_from_end <= days), closes, np.nan)
+    priced = valid.sum(axis=1) >= 2
+    closes = closes[priced]
+    used = ~np.isnan(closes).all(axis=0)
+
+    # Market value per symbol at each date (days present in any symbol), filled forward
+    qty = np.array([qty_by_symbol[s] for s in symbols])[priced]
+    history = pd.DataFrame(
+        (closes[:, used] * qty[:, None]).T,
+        index=pd.to_datetime(matrix["dates"][used]),
+        columns=[s for s, p in zip(symbols, priced) if p],
+    ).ffill()
 
     # Add up all positions for total value per day
     history["portfolio_value"] = history.sum(axis=1)
-    return history
+    history.attrs["positions_version"] = _positions_version(qty_by_symbol)
+    _history_cache[key] = history
+    while len(_history_cache) > HISTORY_CACHE_ENTRIES:
+        _history_cache.popitem(last=False)
+    return history.copy()
 
-def compute_alpaca_portfolio_analytics():
+def compute_alpaca_portfolio_analytics(history=None):
     """
     Returns dict with total_return (percent), annual_volatility (percent), sharpe_ratio, etc.
     Note: annual_volatility is reported as a percentage, matching the calculation.
+    Days of `history` (default: build_alpaca_portfolio_history()) newer than the stored
+    "alpaca" equity curve are appended to it; the metrics cover the whole stored curve.
+    The history values today's positions at past prices, so the stored curve is
+    rebuilt whenever the positions change (or are unknown). Without positions or
+    prices the stored curve is cleared and None is returned.
     """
-    hist = build_alpaca_portfolio_history()
+    hist = history if history is not None else build_alpaca_portfolio_history()
     if hist is None or hist["portfolio_value"].isnull().all():
+        reset_equity(ALPACA_ACCOUNT)
         return None
-
-    hist = hist.dropna(subset=["portfolio_value"])
-    if len(hist) < 3:
+    values = hist["portfolio_value"].dropna()
+    version = hist.attrs.get("positions_version")
+    stats = get_equity_stats(ALPACA_ACCOUNT)
+    if stats and (version is None or stats["source_version"] != version):
+        reset_equity(ALPACA_ACCOUNT)
+    append_equity(ALPACA_ACCOUNT, values.index.strftime("%Y-%m-%d"), values.to_numpy(), version)
+
+    metrics = equity_metrics(ALPACA_ACCOUNT, ddof=1)
+    if metrics is None or metrics["num_days"] < 3:
         return None
-
-    values = hist["portfolio_value"]
-    returns = values.pct_change().dropna()
-    total_return = (values.iloc[-1] / values.iloc[0] - 1) * 100
-    annual_volatility = returns.std() * (252**0.5) * 100  # percent
-    sharpe = (returns.mean() / returns.std()) * (252**0.5) if returns.std() > 0 else None
-    
-    return {
-        "total_return": round(total_return, 2),
-        "annual_volatility": f"{round(annual_volatility, 2)}%" if annual_volatility else "N/A",
-        "sharpe_ratio": round(sharpe, 2) if sharpe is not None else "N/A",
-        "start_value": round(values.iloc[0], 2),
-        "end_value": round(values.iloc[-1], 2),
-        "num_days": len(values),
-    }
+    annual_volatility = metrics["annual_volatility"]
+    metrics["annual_volatility"] = f"{annual_volatility}%" if annual_volatility else "N/A"
+    if metrics["sharpe_ratio"] is None:
+        metrics["sharpe_ratio"] = "N/A"
+    return metrics
 
 
 def create_portfolio_table():
-    conn = sqlite3.connect("local_db/market_data.db")
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS portfolio (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            symbol TEXT NOT NULL,
-            qty INTEGER NOT NULL,
-            cost_basis REAL NOT NULL,
-            buy_date TEXT NOT NULL
-        )
-    """)
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS portfolio (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                symbol TEXT NOT NULL,
+                qty INTEGER NOT NULL,
+                cost_basis REAL NOT NULL,
+                buy_date TEXT NOT NULL
+            )
+        """)
 
 def buy_portfolio(picks, buy_date=None):
     if buy_date is None:
         buy_date = datetime.now().strftime('%Y-%m-%d')
-    conn = sqlite3.connect("local_db/market_data.db")
-    cur = conn.cursor()
-    for pick in picks:
-        symbol = pick['symbol']
-        allocation = pick['allocation']
-        # Get the latest close price from ohlcv
-        price_df = pd.read_sql_query(
-            "SELECT close FROM ohlcv WHERE symbol=? ORDER BY timestamp DESC LIMIT 1",
-            conn,
-            params=(symbol,)
-        )
-        if price_df.empty:
-            continue
-        price = price_df['close'].iloc[0]
-        qty = int(allocation / price)
-        if qty <= 0:
-            continue
-        # Insert the "buy"
-        cur.execute("""
+    orders = pd.DataFrame(picks, columns=["symbol", "allocation"])
+    if orders.empty:
+        return
+    # Latest close for every pick, in one query
+    orders["price"] = orders["symbol"].map(get_latest_prices(orders["symbol"].tolist()))
+    orders = orders.dropna(subset=["price"])
+    orders["qty"] = (orders["allocation"] // orders["price"]).astype(int)
+    orders = orders[orders["qty"] > 0]
+    with transaction() as conn:
+        # Insert the "buys"
+        conn.executemany("""
             INSERT INTO portfolio (symbol, qty, cost_basis, buy_date)
             VALUES (?, ?, ?, ?)
-        """, (symbol, qty, price, buy_date))
+        """, [(symbol, int(qty), float(price), buy_date) for symbol, qty, price in orders[["symbol", "qty", "price"]].itertuples(index=False)])
+    for symbol, qty, price in orders[["symbol", "qty", "price"]].itertuples(index=False):
         print(f"Bought {qty} shares of {symbol} at {price} on {buy_date}")
-    conn.commit()
-    conn.close()
 
 def get_portfolio_snapshot():
-    conn = sqlite3.connect("local_db/market_data.db")
-    cur = conn.cursor()
+    conn = get_connection()
     df = pd.read_sql_query(
         "SELECT symbol, SUM(qty) as qty, AVG(cost_basis) as avg_cost, MIN(buy_date) as first_buy FROM portfolio GROUP BY symbol",
         conn
     )
     if df.empty:
-        conn.close()
         return pd.DataFrame()
-    # Get latest prices
-    for idx, row in df.iterrows():
-        symbol = row['symbol']
-        price_df = pd.read_sql_query(
-            "SELECT close FROM ohlcv WHERE symbol=? ORDER BY timestamp DESC LIMIT 1",
-            conn, params=(symbol,)
-        )
-        latest = price_df['close'].iloc[0] if not price_df.empty else None
-        df.at[idx, 'latest_price'] = latest
-        if latest:
-            df.at[idx, 'market_value'] = round(latest * row['qty'], 2)
-            df.at[idx, 'gain'] = round((latest - row['avg_cost']) * row['qty'], 2)
-            df.at[idx, 'return_pct'] = round(100 * (latest - row['avg_cost']) / row['avg_cost'], 2)
-        else:
-            df.at[idx, 'market_value'] = None
-            df.at[idx, 'gain'] = None
-            df.at[idx, 'return_pct'] = None
-    conn.close()
+    # Latest prices for all holdings in one query; symbols without bars get no value
+    df['latest_price'] = df['symbol'].map(get_latest_prices(df['symbol'].tolist())).astype(float)
+    latest = df['latest_price'].where(df['latest_price'] != 0)
+    df['market_value'] = (latest * df['qty']).round(2)
+    df['gain'] = ((latest - df['avg_cost']) * df['qty']).round(2)
+    df['return_pct'] = (100 * (latest - df['avg_cost']) / df['avg_cost']).round(2)
     return df
 
 def reset_portfolio():
-    conn = sqlite3.connect("local_db/market_data.db")
-    cur = conn.cursor()
-    cur.execute("DELETE FROM portfolio")
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("DELETE FROM portfolio")
+    reset_equity(SIMULATED_ACCOUNT)
     print("Simulated portfolio reset.")
 
-def get_portfolio_performance():
+def simulated_equity_curve(since=None, settled=False):
     """
-    Compute portfolio return, volatility, Sharpe ratio, based on simulated buys and daily price changes.
+    Daily value of the simulated portfolio: every trading day (and every buy
+    date) from the first buy, or from `since` (YYYY-MM-DD) on. With `settled`,
+    days after the newest stored close are left out, as their value can still
+    change. Returns a pandas Series indexed by date, or None if nothing was bought.
     """
-    import sqlite3
-    import pandas as pd
-
-    conn = sqlite3.connect("local_db/market_data.db")
-    cur = conn.cursor()
-    # Get distinct buy dates in order (oldest first)
-    dates = pd.read_sql_query(
-        "SELECT DISTINCT buy_date FROM portfolio ORDER BY buy_date", conn
-    )["buy_date"].tolist()
-    if not dates:
-        conn.close()
+    conn = get_connection()
+    buys = pd.read_sql_query("SELECT symbol, qty, buy_date FROM portfolio", conn)
+    if buys.empty:
         return None
-
-    # Get all buys
-    buys = pd.read_sql_query(
-        "SELECT symbol, qty, cost_basis, buy_date FROM portfolio", conn
+    buys["day"] = pd.to_datetime(buys["buy_date"].str[:10])
+    start = max(buys["day"].min(), pd.Timestamp(since)) if since else buys["day"].min()
+    symbols = sorted(buys["symbol"].unique())
+
+    # All closes needed, in one query: each symbol's last bar on or before the start, and everything after
+    placeholder = ",".join(["?"] * len(symbols))
+    start_epoch = int(start.timestamp()) + 86399
+    closes = pd.read_sql_query(
+        f"""
+        SELECT o.symbol, o.ts_epoch, o.close FROM ohlcv o
+        WHERE o.symbol IN ({placeholder}) AND o.timeframe = ? AND o.ts_epoch >= COALESCE(
+            (SELECT MAX(p.ts_epoch) FROM ohlcv p WHERE p.symbol = o.symbol AND p.timeframe = ? AND p.ts_epoch <= ?), 0)
+        """,
+        conn, params=(*symbols, DEFAULT_TIMEFRAME, DEFAULT_TIMEFRAME, start_epoch),
     )
+    closes["day"] = pd.to_datetime(closes["ts_epoch"] // 86400, unit="D")
+    prices = closes.pivot_table(index="day", columns="symbol", values="close", aggfunc="last")
+
+    # Valuation days: every trading day from the start, plus the buy dates themselves
+    buy_days = pd.DatetimeIndex(buys["day"].unique())
+    timeline = prices.index[prices.index >= start].union(buy_days[buy_days >= start])
+    if settled:
+        timeline = timeline[timeline <= prices.index.max()] if len(prices.index) else timeline[:0]
+    # As-of join: each day gets the latest close on or before it
+    prices = prices.reindex(prices.index.union(timeline)).ffill().reindex(timeline)
+    # Shares held at each day's close: buys pivoted by day, accumulated (earlier buys included)
+    held = buys.pivot_table(index="day", columns="symbol", values="qty", aggfunc="sum")
+    held = held.reindex(held.index.union(timeline), fill_value=0).fillna(0).cumsum().reindex(timeline)
+    return (held * prices.reindex(columns=held.columns)).sum(axis=1, min_count=0)
+
+def _simulated_source_version():
+    row = get_connection().execute(
+        "SELECT COUNT(*), MAX(id), SUM(qty), MIN(buy_date), MAX(buy_date) FROM portfolio"
+    ).fetchone()
+    return "|".join(str(v) for v in row)
+
+def sync_simulated_equity():
+    """
+    Bring the stored "simulated" equity curve up to date: only days after the
+    last stored one are valued, unless the buys changed, which rebuilds it.
+    """
+    version = _simulated_source_version()
+    stats = get_equity_stats(SIMULATED_ACCOUNT)
+    if stats and stats["source_version"] != version:
+        reset_equity(SIMULATED_ACCOUNT)
+        stats = None
+    if stats:
+        # Nothing to value unless a held symbol has a bar after the last stored day
+        latest = get_connection().execute(
+            """SELECT date(MAX(last_epoch), 'unixepoch') FROM ohlcv_watermarks
+               WHERE symbol IN (SELECT DISTINCT symbol FROM portfolio)"""
+        ).fetchone()[0]
+        if latest is None or latest <= stats["last_day"]:
+            return 0
+    curve = simulated_equity_curve(since=stats["last_day"] if stats else None, settled=True)
+    if curve is None:
+        return 0
+    return append_equity(SIMULATED_ACCOUNT, curve.index.strftime("%Y-%m-%d"), curve.to_numpy(), version)
 
-    # For each day, compute value of all positions
-    symbols = buys["symbol"].unique()
-    values_by_day = {}
-    for day in dates:
-        day_value = 0
-        for symbol in symbols:
-            # Find all buys of this symbol up to and including this day
-            symbol_buys = buys[(buys["symbol"] == symbol) & (buys["buy_date"] <= day)]
-            if symbol_buys.empty:
-                continue
-            total_qty = symbol_buys["qty"].sum()
-            # Find latest close on or before this day
-            price_df = pd.read_sql_query(
-                "SELECT close FROM ohlcv WHERE symbol=? AND timestamp<=? ORDER BY timestamp DESC LIMIT 1",
-                conn,
-                params=(symbol, day)
-            )
-            if price_df.empty:
-                continue
-            latest_price = price_df["close"].iloc[0]
-            day_value += total_qty * latest_price
-        values_by_day[day] = day_value
-
-    conn.close()
+def get_portfolio_performance():
+    """
+    Compute portfolio return, volatility, Sharpe ratio, based on simulated buys and daily price changes.
+    The portfolio is valued at the close of every trading day (and every buy date) from the first buy on;
+    the curve and its running statistics are persisted, so only new days are computed.
+    """
+    sync_simulated_equity()
+    metrics = equity_metrics(SIMULATED_ACCOUNT)
     # If less than 2 data points, can't calculate return/volatility
-    if len(values_by_day) < 2:
+    if metrics is None:
         return None
-
-    days = list(values_by_day.keys())
-    values = np.array([values_by_day[d] for d in days])
-    daily_returns = np.diff(values) / values[:-1]
-    total_return = (values[-1] - values[0]) / values[0]
-    avg_daily_return = np.mean(daily_returns)
-    volatility = np.std(daily_returns)
-    sharpe = avg_daily_return / volatility * np.sqrt(252) if volatility > 0 else 0
-
-    return {
-        "total_return": round(total_return * 100, 2),
-        "annual_volatility": round(volatility * np.sqrt(252) * 100, 2),
-        "sharpe_ratio": round(sharpe, 2),
-        "start_value": round(values[0], 2),
-        "end_value": round(values[-1], 2),
-        "num_days": len(days)
-    }
+    if metrics["sharpe_ratio"] is None:
+        metrics["sharpe_ratio"] = 0
+    return metrics
 
 # Add to src/strategy/portfolio.py or as a new function in engine.py
 
@@ -0,0 +1,122 @@
+# src/strategy/ranking_cache.py
+
+# Ranked candidates cached by (data version, filter parameters, model versions):
+# an in-memory LRU per process, backed by pickles on disk so a fresh process
+# (run_strategy, a restarted dashboard) can reuse the last ranking.
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from src.data.db import DB_PATH, get_connection
+from src.strategy import engine
+from src.strategy.features import FEATURE_SET_VERSION, source_version
+from src.strategy.models import MODELS, model_version
+
+CACHE_DIR = os.path.splitext(DB_PATH)[0] + "_ranking_cache"
+MEMORY_ENTRIES = int(os.getenv("RANKING_CACHE_ENTRIES", 16))
+DISK_ENTRIES = int(os.getenv("RANKING_CACHE_DISK_ENTRIES", 64))
+
+# key -> ranked list, most recently used last
+_cache: "OrderedDict[str, List[Dict]]" = OrderedDict()
+_lock = threading.Lock()
+
+def data_version() -> str:
+    """
+    Fingerprint of everything a ranking reads: ingestion watermarks, news and
+    sentiment aggregates, fundamentals, and the feature snapshot in use.
+    """
+    conn = get_connection()
+    parts = [datetime.now().strftime("%Y-%m-%d"), FEATURE_SET_VERSION, source_version()]
+    try:
+        parts.extend(conn.execute(
+            """SELECT as_of, MAX(built_at) FROM features_daily
+               WHERE version = ? AND as_of = (SELECT MAX(as_of) FROM features_daily WHERE version = ?)""",
+            (FEATURE_SET_VERSION, FEATURE_SET_VERSION),
+        ).fetchone())
+    except Exception:
+        parts.append(None)
+    return "\x1f".join(str(p) for p in parts)
+
+def cache_key(symbols: Optional[List[str]] = None) -> str:
+    parts = [
+        data_version(),
+        engine.MAX_PE_RATIO, engine.MIN_DIVIDEND_YIELD,
+        ",".join(sorted(set(symbols))) if symbols else "*",
+        *(model_version(name) for name in MODELS),
+    ]
+    return hashlib.sha1("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+def _spill_path(key: str) -> str:
+    return os.path.join(CACHE_DIR, f"{key}.pkl")
+
+def _remember(key: str, ranked: List[Dict]):
+    with _lock:
+        _cache[key] = ranked
+        _cache.move_to_end(key)
+        while len(_cache) > MEMORY_ENTRIES:
+            _cache.popitem(last=False)
+
+def _read_spill(key: str) -> Optional[List[Dict]]:
+    path = _spill_path(key)
+    try:
+        with open(path, "rb") as f:
+            ranked = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️ Ignoring unreadable ranking cache {path}: {e}")
+        return None
+    os.utime(path)
+    return ranked
+
+def _write_spill(key: str, ranked: List[Dict]):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = _spill_path(key) + f".{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(ranked, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, _spill_path(key))
+        # Keep only the most recently used spills
+        spills = sorted(
+            (e for e in os.scandir(CACHE_DIR) if e.name.endswith(".pkl")),
+            key=lambda e: e.stat().st_mtime, reverse=True,
+        )
+        for stale in spills[DISK_ENTRIES:]:
+            os.remove(stale.path)
+    except OSError as e:
+        print(f"⚠️ Could not write ranking cache: {e}")
+
+def get_ranked(symbols: Optional[List[str]] = None) -> List[Dict]:
+    """
+    load_candidates + filter_and_score for `symbols` (default: all), served
+    from cache while the data, filters and models are unchanged. Returns fresh
+    copies of the stock dicts, so callers may modify them.
+    """
+    key = cache_key(symbols)
+    with _lock:
+        ranked = _cache.get(key)
+        if ranked is not None:
+            _cache.move_to_end(key)
+    if ranked is None:
+        ranked = _read_spill(key)
+        if ranked is not None:
+            _remember(key, ranked)
+    if ranked is None:
+        ranked = engine.filter_and_score(engine.load_candidates(symbols))
+        # Loading may have built today's snapshot, which changes the version: file under the new one
+        key = cache_key(symbols)
+        _remember(key, ranked)
+        _write_spill(key, ranked)
+    return [dict(stock) for stock in ranked]
+
+def clear_cache(disk: bool = True):
+    with _lock:
+        _cache.clear()
+    if disk and os.path.isdir(CACHE_DIR):
+        for entry in os.scandir(CACHE_DIR):
+            if entry.name.endswith(".pkl"):
+                os.remove(entry.path)
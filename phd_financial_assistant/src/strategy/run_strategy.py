@@ -1,14 +1,13 @@
 # src/strategy/run_strategy.py
 
 import sys
-from src.strategy.engine import load_candidates, filter_and_score, allocate_portfolio, generate_explanation
+from src.strategy.engine import allocate_portfolio, generate_explanation
+from src.strategy.scoring_service import get_ranked
 from src.utils.mail import send_email
 
 def main(send_mail=False):
-    print("📊 Loading candidates...")
-    stocks = load_candidates()
-    print("✅ Filtering and scoring...")
-    ranked = filter_and_score(stocks)
+    print("📊 Loading and scoring candidates...")
+    ranked = get_ranked()
     portfolio = allocate_portfolio(ranked, budget=1000.0)
 
     print("\n📈 Top picks:")
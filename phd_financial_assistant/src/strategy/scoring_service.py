@@ -0,0 +1,148 @@
+# src/strategy/scoring_service.py
+
+# Resident scoring daemon on localhost HTTP. It keeps the models and recent
+# rankings in memory and re-ranks the universe in the background when new data
+# lands. get_ranked/allocate ask the daemon when it is running and do the work
+# in-process otherwise.
+#
+#   python -m src.strategy.scoring_service [--port 8766] [--refresh-sec 30]
+#
+#   GET  /health                          -> {"status": "ok", "data_version": ...}
+#   POST /rank     {"symbols": [...]}     -> {"ranked": [...]}
+#   POST /allocate {"symbols": [...], "budget": 1000.0, "method": "score"}
+#                                         -> {"ranked": [...], "portfolio": [...]}
+import argparse
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from src.strategy import ranking_cache
+from src.strategy.engine import allocate_portfolio
+
+HOST = "127.0.0.1"
+DEFAULT_PORT = int(os.getenv("SCORING_SERVICE_PORT", 8766))
+# Set SCORING_SERVICE_URL to "" to always score in-process
+SERVICE_URL = os.getenv("SCORING_SERVICE_URL", f"http://{HOST}:{DEFAULT_PORT}")
+REQUEST_TIMEOUT_SEC = float(os.getenv("SCORING_SERVICE_TIMEOUT", 30))
+# After a failed call, stay in-process this long before trying the daemon again
+RETRY_AFTER_SEC = 30
+DEFAULT_REFRESH_SEC = 30
+
+_unavailable_until = 0.0
+
+
+# ---- Daemon ----
+
+class _Handler(BaseHTTPRequestHandler):
+    def _reply(self, status: int, body: Dict):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._reply(200, {"status": "ok", "data_version": ranking_cache.data_version()})
+        else:
+            self._reply(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            ranked = ranking_cache.get_ranked(request.get("symbols"))
+            if self.path == "/rank":
+                self._reply(200, {"ranked": ranked})
+            elif self.path == "/allocate":
+                portfolio = allocate_portfolio(
+                    ranked, budget=float(request.get("budget", 1000.0)), method=request.get("method", "score"),
+                )
+                self._reply(200, {"ranked": ranked, "portfolio": portfolio})
+            else:
+                self._reply(404, {"error": f"unknown path {self.path}"})
+        except Exception as e:
+            print(f"❌ {self.path} failed: {e}")
+            self._reply(500, {"error": repr(e)})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _refresh_loop(interval: float, stop: threading.Event):
+    """Re-rank the whole universe whenever the data version moves, so requests find it warm."""
+    last = None
+    while not stop.is_set():
+        try:
+            version = ranking_cache.cache_key()
+            if version != last:
+                t0 = time.perf_counter()
+                n = len(ranking_cache.get_ranked())
+                last = ranking_cache.cache_key()
+                print(f"🔄 Ranked {n} candidates in {time.perf_counter() - t0:.2f}s")
+        except Exception as e:
+            print(f"❌ Background refresh failed: {e}")
+        stop.wait(interval)
+
+def serve(port: int = DEFAULT_PORT, refresh_sec: float = DEFAULT_REFRESH_SEC):
+    server = ThreadingHTTPServer((HOST, port), _Handler)
+    server.daemon_threads = True
+    stop = threading.Event()
+    threading.Thread(target=_refresh_loop, args=(refresh_sec, stop), daemon=True).start()
+    print(f"✅ Scoring service listening on http://{HOST}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+
+
+# ---- Client ----
+
+def _call(path: str, body: Dict) -> Optional[Dict]:
+    """POST to the daemon; None if it is not running or the call fails."""
+    global _unavailable_until
+    if not SERVICE_URL or time.monotonic() < _unavailable_until:
+        return None
+    request = urllib.request.Request(
+        SERVICE_URL + path, data=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT_SEC) as response:
+            return json.loads(response.read())
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        if not isinstance(getattr(e, "reason", None), ConnectionRefusedError):
+            print(f"⚠️ Scoring service unavailable ({e}), scoring in-process")
+        _unavailable_until = time.monotonic() + RETRY_AFTER_SEC
+        return None
+
+def get_ranked(symbols: Optional[List[str]] = None) -> List[Dict]:
+    """Ranked candidates for `symbols` (default: all), from the daemon if it is up."""
+    reply = _call("/rank", {"symbols": symbols})
+    if reply is not None:
+        return reply["ranked"]
+    return ranking_cache.get_ranked(symbols)
+
+def allocate(budget: float = 1000.0, symbols: Optional[List[str]] = None, method: str = "score") -> Dict[str, List[Dict]]:
+    """{"ranked", "portfolio"} for `budget` over `symbols`, from the daemon if it is up."""
+    reply = _call("/allocate", {"symbols": symbols, "budget": budget, "method": method})
+    if reply is not None:
+        return reply
+    ranked = ranking_cache.get_ranked(symbols)
+    return {"ranked": ranked, "portfolio": allocate_portfolio(ranked, budget=budget, method=method)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the local scoring service.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--refresh-sec", type=float, default=DEFAULT_REFRESH_SEC, help="How often to check for new data")
+    args = parser.parse_args()
+    serve(args.port, args.refresh_sec)
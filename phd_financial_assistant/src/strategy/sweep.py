@@ -0,0 +1,230 @@
+# src/strategy/sweep.py
+
+# Parameter sweep over the strategy's thresholds (P/E cap, minimum dividend
+# yield, number of positions, volatility limit), backtested in parallel.
+# The price and feature matrices are built once and placed in shared memory;
+# worker processes map them as read-only NumPy views instead of copying them.
+import argparse
+import itertools
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.data.columnar import load_matrix
+from src.data.db import get_connection, transaction, bulk_insert
+from src.strategy.backtest import (
+    forward_fill, performance_metrics, rebalance_days, score_weights, simulate, snapshot_scores, top_k,
+)
+from src.strategy.engine import MAX_PE_RATIO, MIN_DIVIDEND_YIELD, PRICE_WINDOW, VOLATILITY_LOW_THRESHOLD
+
+PARAMETERS = ("max_pe", "min_dividend_yield", "positions", "max_volatility")
+DEFAULT_GRID = {
+    "max_pe": [20, 30, MAX_PE_RATIO, 60],
+    "min_dividend_yield": [0.0, 0.005, MIN_DIVIDEND_YIELD, 0.02],
+    "positions": [3, 5, 10],
+    # Daily volatility (%) over the last PRICE_WINDOW bars; None = no limit
+    "max_volatility": [None, 1.5, VOLATILITY_LOW_THRESHOLD, 3.0],
+}
+# Observed daily returns a volatility needs; below this it is unknown and fails any limit
+MIN_VOLATILITY_RETURNS = PRICE_WINDOW // 2
+METRICS = ("total_return", "annual_volatility", "sharpe_ratio", "max_drawdown", "avg_turnover", "end_value")
+RESULT_COLUMNS = ("sweep_id", "config_id", *PARAMETERS, *METRICS, "rank")
+
+# Worker-side views of the shared matrices, set by _attach
+_arrays: Dict[str, np.ndarray] = {}
+_segments: List[shared_memory.SharedMemory] = []
+
+def init_sweep_table():
+    with transaction() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sweep_results (
+                sweep_id TEXT NOT NULL,
+                config_id INTEGER NOT NULL,
+                max_pe REAL,
+                min_dividend_yield REAL,
+                positions INTEGER,
+                max_volatility REAL,
+                total_return REAL,
+                annual_volatility REAL,
+                sharpe_ratio REAL,
+                max_drawdown REAL,
+                avg_turnover REAL,
+                end_value REAL,
+                rank INTEGER,
+                PRIMARY KEY (sweep_id, config_id)
+            )
+        """)
+
+def trailing_volatility(closes: np.ndarray, window: int = PRICE_WINDOW,
+                        min_returns: int = MIN_VOLATILITY_RETURNS) -> np.ndarray:
+    """
+    Daily volatility (%) of each symbol over the trailing `window` bars, for
+    every date of a (symbols x dates) close matrix. Returns are taken between
+    consecutive observed closes only, so missing bars are left out instead of
+    counting as flat days; NaN with fewer than `min_returns` returns.
+    """
+    daily = pd.DataFrame(closes.T).pct_change(fill_method=None)
+    return daily.rolling(window, min_periods=min_returns).std().to_numpy().T * 100
+
+def build_inputs(start: str = None, end: str = None, frequency="M") -> Optional[Dict[str, np.ndarray]]:
+    """
+    Everything a configuration is evaluated on, with thresholds not yet applied:
+    forward-filled prices (symbols x days), the rebalance days, and per
+    rebalance (symbols x rebalances) whether the stock traded, its unfiltered
+    model score and rank, P/E, dividend yield and trailing daily volatility (%).
+    """
+    symbols = [row[0] for row in get_connection().execute("SELECT symbol FROM fundamentals ORDER BY symbol")]
+    matrix = load_matrix(symbols, start, end, fields=("close",))
+    dates, closes = matrix["dates"], matrix["close"]
+    if len(dates) < 2:
+        return None
+    prices = forward_fill(closes)
+    rebalances = rebalance_days(dates, frequency)
+    snapshots = snapshot_scores(symbols, max_pe=np.inf, min_dividend_yield=-np.inf)
+    if not len(snapshots["dates"]):
+        return None
+    snap = np.clip(np.searchsorted(snapshots["dates"], dates[rebalances], side="right") - 1, 0, None)
+    volatility = trailing_volatility(closes)
+    return {
+        "prices": prices,
+        "rebalances": rebalances,
+        "traded": ~np.isnan(closes[:, rebalances]),
+        "score": snapshots["score"][:, snap],
+        "rank": snapshots["rank"][:, snap],
+        "pe_ratio": snapshots["pe_ratio"][:, snap],
+        "dividend_yield": snapshots["dividend_yield"][:, snap],
+        "volatility": volatility[:, rebalances],
+    }
+
+def _share(arrays: Dict[str, np.ndarray]):
+    """Copy `arrays` into shared memory blocks. Returns (blocks, {name: (block name, shape, dtype)})."""
+    blocks, specs = [], {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        specs[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, specs
+
+def _open_block(name: str) -> shared_memory.SharedMemory:
+    try:
+        # Python 3.13+: only the parent tracks (and unlinks) the block
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Older versions: pool workers share the parent's resource tracker, so registering again is harmless
+        return shared_memory.SharedMemory(name=name)
+
+def _attach(specs: Dict):
+    """Pool initializer: map the shared blocks as read-only arrays."""
+    for name, (block_name, shape, dtype) in specs.items():
+        block = _open_block(block_name)
+        _segments.append(block)
+        view = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+        view.flags.writeable = False
+        _arrays[name] = view
+
+def evaluate(config: Dict, arrays: Dict[str, np.ndarray] = None, cost_bps: float = 0.0) -> Dict:
+    """Backtest one threshold configuration. Returns the config with METRICS added."""
+    a = arrays if arrays is not None else _arrays
+    pe, div = a["pe_ratio"], a["dividend_yield"]
+    with np.errstate(invalid="ignore"):
+        keep = a["traded"] & ~np.isnan(a["score"]) & (pe <= config["max_pe"]) & ~(div < config["min_dividend_yield"])
+        if config["max_volatility"] is not None:
+            keep &= a["volatility"] <= config["max_volatility"]
+    order, eligible = top_k(np.where(keep, a["rank"], np.nan), int(config["positions"]))
+    weights = score_weights(np.where(keep, a["score"], 0.0), order, eligible)
+    equity, turnover = simulate(a["prices"], weights, a["rebalances"], cost_bps=cost_bps)
+
+    metrics = performance_metrics(equity) or {}
+    high_water = np.maximum.accumulate(equity)
+    return {
+        **config,
+        "total_return": metrics.get("total_return"),
+        "annual_volatility": metrics.get("annual_volatility"),
+        "sharpe_ratio": metrics.get("sharpe_ratio"),
+        "max_drawdown": round(float(np.max(1 - equity / high_water)) * 100, 2),
+        "avg_turnover": round(float(turnover[1:].mean()) * 100, 2) if len(turnover) > 1 else 0.0,
+        "end_value": metrics.get("end_value"),
+    }
+
+def _evaluate_with_cost(args):
+    config, cost_bps = args
+    return evaluate(config, cost_bps=cost_bps)
+
+def grid_configs(grid: Dict[str, List] = None) -> List[Dict]:
+    grid = grid or DEFAULT_GRID
+    return [dict(zip(PARAMETERS, values)) for values in itertools.product(*(grid[p] for p in PARAMETERS))]
+
+def random_configs(n: int, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    return [
+        {
+            "max_pe": round(rng.uniform(10, 80), 1),
+            "min_dividend_yield": round(rng.uniform(0, 0.03), 4),
+            "positions": rng.randint(3, 15),
+            "max_volatility": None if rng.random() < 0.25 else round(rng.uniform(1.0, 4.0), 2),
+        }
+        for _ in range(n)
+    ]
+
+def run_sweep(configs: List[Dict], start: str = None, end: str = None, frequency="M",
+              workers: int = None, cost_bps: float = 0.0) -> List[Dict]:
+    """
+    Backtest every configuration across `workers` processes (default: all
+    cores) and store the results in sweep_results, ranked by Sharpe ratio.
+    Returns the results, best first.
+    """
+    inputs = build_inputs(start, end, frequency)
+    if inputs is None:
+        print("❌ Not enough data to run a sweep.")
+        return []
+    workers = workers or os.cpu_count() or 1
+    blocks, specs = _share(inputs)
+    try:
+        chunksize = max(1, len(configs) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(specs,)) as pool:
+            results = list(pool.map(_evaluate_with_cost, [(c, cost_bps) for c in configs], chunksize=chunksize))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    results.sort(key=lambda r: (r["sharpe_ratio"] is None, -(r["sharpe_ratio"] or 0), -(r["total_return"] or 0)))
+    sweep_id = datetime.now().strftime("%Y%m%dT%H%M%S")
+    for rank, result in enumerate(results, 1):
+        result["rank"] = rank
+    init_sweep_table()
+    bulk_insert(
+        "sweep_results", RESULT_COLUMNS,
+        [(sweep_id, config_id, *(r[c] for c in RESULT_COLUMNS[2:])) for config_id, r in enumerate(results)],
+        conflict="REPLACE",
+    )
+    print(f"Stored {len(results)} results as sweep {sweep_id}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep the strategy's thresholds over historical data.")
+    parser.add_argument("--random", type=int, metavar="N", help="Evaluate N random configurations instead of the grid")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start", help="First date (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Last date (YYYY-MM-DD)")
+    parser.add_argument("--frequency", default="M", help="Rebalance every D/W/M/Q, or every N bars")
+    parser.add_argument("--workers", type=int, help="Processes to use (default: all cores)")
+    parser.add_argument("--cost-bps", type=float, default=0.0, help="Trading cost in basis points of traded value")
+    parser.add_argument("--top", type=int, default=10, help="Results to print")
+    args = parser.parse_args()
+
+    configs = random_configs(args.random, args.seed) if args.random else grid_configs()
+    t0 = time.perf_counter()
+    results = run_sweep(configs, args.start, args.end, args.frequency, args.workers, args.cost_bps)
+    print(f"Evaluated {len(results)} configurations in {time.perf_counter() - t0:.1f}s")
+    for r in results[: args.top]:
+        print("  " + ", ".join(f"{k}={r[k]}" for k in ("rank", *PARAMETERS, *METRICS)))
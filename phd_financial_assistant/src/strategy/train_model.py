@@ -1,5 +1,4 @@
 import os
-import sqlite3
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor
@@ -7,6 +6,9 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error
 import joblib
 import time
+from src.data.db import DB_PATH, get_connection
+from src.strategy.features import FEATURE_FIELDS, load_features
+from src.strategy.models import MODEL_DIR, MODELS, NATIVE_XGB_EXT
 
 # Add XGBoost import
 try:
@@ -15,33 +17,30 @@ except ImportError:
     raise ImportError("Please install xgboost: pip install xgboost")
 
 # Ensure the model directory exists
-os.makedirs("model", exist_ok=True) 
-# Ensure the local_db directory exists
-os.makedirs("local_db", exist_ok=True)
+os.makedirs(MODEL_DIR, exist_ok=True)
+RF_MODEL_PATH = os.path.join(MODEL_DIR, MODELS["rf"] + ".pkl")
+XGB_MODEL_PATH = os.path.join(MODEL_DIR, MODELS["xgb"] + ".pkl")
 # Ensure the database file exists
-if not os.path.exists("local_db/market_data.db"):
-    # Create an empty database file if it doesn't exist
-    conn = sqlite3.connect("local_db/market_data.db")
-    conn.close()
+if not os.path.exists(DB_PATH):
+    # Opening a connection creates an empty database file
+    get_connection()
     print("Created empty market_data.db in local_db directory.")
 
 # This script trains a stock scoring model using fundamentals and news sentiment data.
 # It assumes the database is already populated with the necessary data.
 
 # Check if the model is current based on the latest data in the database
-def model_is_current(model_path="model/stock_score_model.pkl"):
+def model_is_current(model_path=RF_MODEL_PATH):
     if not os.path.exists(model_path):
         return False
     model_mtime = os.path.getmtime(model_path)
-    conn = sqlite3.connect("local_db/market_data.db")
-    cur = conn.cursor()
-    cur.execute("SELECT MAX(timestamp) FROM ohlcv")
+    cur = get_connection().cursor()
+    cur.execute("SELECT date(MAX(ts_epoch), 'unixepoch') FROM ohlcv")
     ohlcv_max = cur.fetchone()[0]
     cur.execute("SELECT MAX(published) FROM news")
     news_max = cur.fetchone()[0]
     cur.execute("SELECT MAX(rowid) FROM fundamentals")
     fundamentals_max = cur.fetchone()[0]
-    conn.close()
     import time
     latest_data_time = max([
         int(time.mktime(time.strptime(str(t), "%Y-%m-%d"))) if t else 0
@@ -50,16 +49,10 @@ def model_is_current(model_path="model/stock_score_model.pkl"):
     return model_mtime > latest_data_time
 
 
-DB_PATH = "local_db/market_data.db"
-
 # Load features + target
 def load_training_data():
-    conn = sqlite3.connect(DB_PATH)
-    df_fund = pd.read_sql_query("SELECT * FROM fundamentals", conn)
-    df_news = pd.read_sql_query("SELECT symbol, AVG(sentiment) AS sentiment FROM news GROUP BY symbol", conn)
-    conn.close()
-
-    df = pd.merge(df_fund, df_news, on="symbol", how="left")
+    # Same snapshot the engine scores from, so training and serving features match
+    df = pd.DataFrame(load_features(), columns=list(FEATURE_FIELDS)).rename(columns={"avg_sentiment": "sentiment"})
 
     # Fill missing numeric values with defaults
     df["pe_ratio"] = pd.to_numeric(df["pe_ratio"], errors="coerce").fillna(30.0)
@@ -93,8 +86,8 @@ rf_rmse = np.sqrt(mean_squared_error(y_test, rf_preds))
 print(f"✅ RandomForest Model trained. RMSE = {rf_rmse:.4f}")
 
 # Save RandomForest model
-joblib.dump(rf_model, "model/stock_score_model.pkl")
-print("✅ RandomForest Model saved to model/stock_score_model.pkl")
+joblib.dump(rf_model, RF_MODEL_PATH)
+print(f"✅ RandomForest Model saved to {RF_MODEL_PATH}")
 
 # --- XGBoost ---
 xgb_model = XGBRegressor(n_estimators=100, max_depth=3, random_state=42, use_label_encoder=False, eval_metric='rmse')
@@ -104,5 +97,7 @@ xgb_rmse = np.sqrt(mean_squared_error(y_test, xgb_preds))
 print(f"✅ XGBoost Model trained. RMSE = {xgb_rmse:.4f}")
 
 # Save XGBoost model
-joblib.dump(xgb_model, "model/xgb_stock_score_model.pkl")
-print("✅ XGBoost Model saved to model/xgb_stock_score_model.pkl")
+joblib.dump(xgb_model, XGB_MODEL_PATH)
+print(f"✅ XGBoost Model saved to {XGB_MODEL_PATH}")
+# Native format too: the engine's model registry loads it without unpickling
+xgb_model.save_model(os.path.join(MODEL_DIR, MODELS["xgb"] + NATIVE_XGB_EXT))
@@ -36,24 +36,17 @@ def get_latest_price(symbol: str):
         return None
 
 def get_price_history(symbol, days=30):
-    import sqlite3
     import pandas as pd
-    conn = sqlite3.connect("local_db/market_data.db")
-    df = pd.read_sql_query(
-        "SELECT timestamp, close FROM ohlcv WHERE symbol=? ORDER BY timestamp DESC LIMIT ?",
-        conn,
-        params=(symbol, days)
-    )
-
-    print(f"{symbol}: {df.shape[0]} bars fetched")  # Debug line
-
-    conn.close()
-    # Ensure it's sorted in ascending timestamp order
-    df = df.sort_values("timestamp")
-    if len(df) < 2:
+    from src.data.columnar import load_series
+    bars = load_series(symbol)
+    closes, dates = bars.get("close", []), bars.get("day", [])
+
+    print(f"{symbol}: {min(len(closes), days)} bars fetched")  # Debug line
+
+    if len(closes) < 2:
         return None
-    # Return pandas Series with timestamps as index, close price as values
-    return pd.Series(df["close"].values, index=pd.to_datetime(df["timestamp"]))
+    # Return pandas Series with dates as index, close price as values (ascending)
+    return pd.Series(closes[-days:], index=pd.to_datetime(dates[-days:].astype("datetime64[D]")))
 
 # Add to src/trading/alpaca_client.py
 
@@ -0,0 +1,15 @@
+# tests/conftest.py
+
+# Point the data layer at a scratch database before any src module is imported
+import os
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+os.environ["MARKET_DATA_DB"] = os.path.join(tempfile.mkdtemp(prefix="pfa_tests_"), "market_data.db")
+os.environ.setdefault("ALPACA_API_KEY", "test")
+os.environ.setdefault("ALPACA_SECRET_KEY", "test")
+os.environ.setdefault("SCORING_SERVICE_URL", "")
@@ -0,0 +1,18 @@
+# tests/test_allocation.py
+import numpy as np
+
+from src.strategy.allocation import optimize
+
+
+def test_risk_parity_with_negatively_correlated_asset():
+    # Four assets loading ~1 on the market, one hedging it at -0.6
+    beta = np.array([1.0, 1.05, 0.95, 1.1, -0.6])
+    cov = np.outer(beta, beta) * 1e-4 + np.diag([4e-5, 5e-5, 3e-5, 6e-5, 5e-5])
+
+    w = optimize(cov, "risk_parity", cap=1.0)
+
+    assert np.all(np.isfinite(w))
+    assert np.all(w > 0)
+    assert np.isclose(w.sum(), 1.0)
+    contributions = w * (cov @ w)
+    np.testing.assert_allclose(contributions, contributions.mean(), rtol=1e-6)
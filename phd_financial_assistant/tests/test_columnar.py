@@ -0,0 +1,44 @@
+# tests/test_columnar.py
+import os
+import threading
+
+import numpy as np
+
+from src.data import columnar
+from src.data.storage import init_db
+
+
+def test_concurrent_saves_of_one_symbol(tmp_path):
+    path = str(tmp_path / "SYM.npy")
+    arrays = [np.full(200_000, i, dtype=np.float64) for i in range(8)]
+    errors = []
+
+    def writer(arr):
+        try:
+            for _ in range(10):
+                columnar._save(path, arr)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(arr,)) for arr in arrays]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    stored = np.load(path)
+    assert len(stored) == 200_000 and np.all(stored == stored[0])
+    assert os.listdir(tmp_path) == ["SYM.npy"]
+
+def test_symbol_without_bars_is_not_requeried(tmp_path, monkeypatch):
+    init_db()
+    calls = []
+    copy = columnar._copy_from_db
+    monkeypatch.setattr(columnar, "_copy_from_db", lambda symbols, root: calls.append(symbols) or copy(symbols, root))
+
+    root = str(tmp_path)
+    for _ in range(3):
+        matrix = columnar.load_matrix(["NOBARS"], root=root)
+        assert matrix["close"].shape == (1, 0)
+    assert calls == [["NOBARS"]]
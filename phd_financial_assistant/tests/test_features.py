@@ -0,0 +1,31 @@
+# tests/test_features.py
+from src.data.db import transaction
+from src.data.fundamentals import init_fundamentals_table
+from src.data.storage import init_db
+from src.strategy import features
+
+
+def _set_fundamentals(pe_ratio, fetched_at):
+    with transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO fundamentals (symbol, pe_ratio, dividend_yield, market_cap, sector, industry, fetched_at) "
+            "VALUES ('FEAT', ?, 0.02, 1e9, 'Tech', 'Software', ?)",
+            (pe_ratio, fetched_at),
+        )
+
+def test_snapshot_is_rebuilt_when_inputs_change_the_same_day(monkeypatch):
+    init_db()
+    init_fundamentals_table()
+    builds = []
+    build = features.build_features_daily
+    monkeypatch.setattr(features, "build_features_daily", lambda *a: builds.append(a) or build(*a))
+
+    _set_fundamentals(12.0, "2024-01-01T09:00:00")
+    assert features.load_features(["FEAT"])[0]["pe_ratio"] == 12.0
+    assert features.load_features(["FEAT"])[0]["pe_ratio"] == 12.0
+    assert len(builds) == 1
+
+    # Fundamentals re-ingested later the same day, without the pipeline's features stage
+    _set_fundamentals(15.0, "2024-01-01T15:00:00")
+    assert features.load_features(["FEAT"])[0]["pe_ratio"] == 15.0
+    assert len(builds) == 2
@@ -0,0 +1,29 @@
+# tests/test_freshness.py
+import time
+
+from src.data.db import connect, transaction
+from src.data.freshness import build_refresh_plan
+
+
+def test_plan_is_read_only_and_does_not_wait_for_writers(tmp_path):
+    path = str(tmp_path / "plan.db")
+    with transaction(path) as conn:
+        # An older layout: no fetched_at column, no freshness indexes
+        conn.execute("CREATE TABLE fundamentals (symbol TEXT PRIMARY KEY, pe_ratio REAL)")
+        conn.executemany("INSERT INTO fundamentals VALUES (?, ?)", [("AAA", 10.0), ("^GSPC", None)])
+
+    writer = connect(path)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        t0 = time.perf_counter()
+        plan = build_refresh_plan("2024-01-02", db_path=path)
+        assert time.perf_counter() - t0 < 1.0
+    finally:
+        writer.rollback()
+        writer.close()
+
+    assert plan == {"universe": ["AAA"], "ohlcv": ["AAA"], "news": ["AAA"], "fundamentals": ["AAA"]}
+    with transaction(path) as conn:
+        assert conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'index')").fetchall() == [
+            ("fundamentals",), ("sqlite_autoindex_fundamentals_1",),
+        ]
@@ -0,0 +1,21 @@
+# tests/test_pipeline.py
+import os
+
+from src.data.db import DB_PATH, get_connection
+from src.pipeline import LOG_DIR, Stage, new_run_id, run_pipeline
+
+
+def test_run_ids_are_unique_and_time_ordered():
+    ids = [new_run_id() for _ in range(1000)]
+    assert len(set(ids)) == len(ids)
+    assert [i.split("-")[0] for i in ids] == sorted(i.split("-")[0] for i in ids)
+
+def test_runs_in_the_same_second_keep_their_own_records():
+    stage = Stage("zen", "this")
+    assert run_pipeline([stage]) == {"zen": "ok"}
+    assert run_pipeline([stage]) == {"zen": "ok"}
+
+    run_ids = [row[0] for row in get_connection().execute("SELECT run_id FROM pipeline_runs WHERE stage = 'zen'")]
+    assert len(set(run_ids)) == 2
+    assert LOG_DIR == os.path.join(os.path.dirname(DB_PATH), "pipeline_logs")
+    assert sorted(os.listdir(LOG_DIR)) == sorted(f"{run_id}_zen.log" for run_id in run_ids)
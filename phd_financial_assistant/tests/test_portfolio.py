@@ -0,0 +1,44 @@
+# tests/test_portfolio.py
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from src.data.storage import init_db, save_ohlcv
+from src.strategy import portfolio
+from src.strategy.equity import get_equity_stats
+from src.strategy.portfolio import ALPACA_ACCOUNT, build_alpaca_portfolio_history, compute_alpaca_portfolio_analytics
+
+
+def _flat_bars(days=10, price=100.0):
+    start = datetime(2024, 1, 1, 5, tzinfo=timezone.utc)
+    return [
+        SimpleNamespace(t=start + timedelta(days=i), o=price, h=price, l=price, c=price, v=1000)
+        for i in range(days)
+    ]
+
+def test_alpaca_position_change_is_not_a_return():
+    init_db()
+    save_ohlcv("FLAT", _flat_bars())
+
+    before = compute_alpaca_portfolio_analytics(build_alpaca_portfolio_history([{"symbol": "FLAT", "qty": "10"}]))
+    after = compute_alpaca_portfolio_analytics(build_alpaca_portfolio_history([{"symbol": "FLAT", "qty": "20"}]))
+
+    assert before["total_return"] == 0
+    assert after["total_return"] == 0
+    assert after["start_value"] == after["end_value"] == 2000
+    assert after["max_drawdown"] == 0
+    assert after["annual_volatility"] == "N/A"
+
+@pytest.mark.parametrize("positions", [[], {"error": "fetch failed"}])
+def test_alpaca_analytics_without_positions_clears_the_curve(positions, monkeypatch):
+    init_db()
+    save_ohlcv("FLAT", _flat_bars())
+    assert compute_alpaca_portfolio_analytics(build_alpaca_portfolio_history([{"symbol": "FLAT", "qty": "10"}]))
+
+    # Explicitly no positions, and the fetch path (get_alpaca_portfolio returns [] on errors)
+    assert compute_alpaca_portfolio_analytics(build_alpaca_portfolio_history(positions)) is None
+    assert compute_alpaca_portfolio_analytics(build_alpaca_portfolio_history([{"symbol": "FLAT", "qty": "10"}]))
+    monkeypatch.setattr(portfolio, "get_alpaca_portfolio", lambda: [])
+    assert compute_alpaca_portfolio_analytics() is None
+    assert get_equity_stats(ALPACA_ACCOUNT) is None
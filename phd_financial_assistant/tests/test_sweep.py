@@ -0,0 +1,39 @@
+# tests/test_sweep.py
+import numpy as np
+
+from src.strategy.backtest import forward_fill
+from src.strategy.sweep import evaluate, trailing_volatility
+
+
+def test_volatility_ignores_missing_bars_instead_of_counting_them_flat():
+    rng = np.random.default_rng(0)
+    full = 100 * np.cumprod(1 + rng.normal(0, 0.02, 400))
+    gappy = full.copy()
+    gappy[rng.random(400) < 0.3] = np.nan
+    sparse = full.copy()
+    sparse[1::2] = np.nan  # never two bars in a row
+    closes = np.vstack([full, gappy, sparse])
+
+    vol = trailing_volatility(closes, window=60, min_returns=20)[:, -1]
+    filled = trailing_volatility(forward_fill(closes), window=60, min_returns=20)[:, -1]
+
+    assert abs(vol[1] - vol[0]) < 0.5
+    assert filled[1] < vol[1]
+    assert np.isnan(vol[2]) and filled[2] > 0
+
+def test_unknown_volatility_fails_a_volatility_limit():
+    # The top-ranked stock doubles but its volatility is unknown; the runner-up is flat
+    arrays = {
+        "prices": np.array([[100.0, 150.0, 200.0], [100.0, 100.0, 100.0]]),
+        "rebalances": np.array([0]),
+        "traded": np.ones((2, 1), dtype=bool),
+        "score": np.array([[2.0], [1.0]]),
+        "rank": np.array([[2.0], [1.0]]),
+        "pe_ratio": np.full((2, 1), 10.0),
+        "dividend_yield": np.full((2, 1), 0.02),
+        "volatility": np.array([[np.nan], [1.0]]),
+    }
+    config = {"max_pe": 40, "min_dividend_yield": 0.0, "positions": 1}
+
+    assert evaluate({**config, "max_volatility": None}, arrays)["end_value"] == 2000.0
+    assert evaluate({**config, "max_volatility": 2.0}, arrays)["end_value"] == 1000.0